@@ -0,0 +1,15 @@
+import argparse
+import asyncio
+
+from server import client, build_related_products
+
+async def run(full: bool):
+    result = await build_related_products(full=full)
+    print(f"Processed {result['orders']} orders, updated related products for {result['products_updated']} products")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update 'frequently bought together' recommendations from orders")
+    parser.add_argument("--full", action="store_true", help="rebuild from the whole order history")
+    args = parser.parse_args()
+    asyncio.run(run(args.full))
@@ -0,0 +1,24 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+from server import client, import_catalog, IMPORT_FORMATS
+
+async def run_import(path: Path, fmt: str, job_id: str = None):
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        async for report in import_catalog(stream, fmt, job_id):
+            errors = report.pop("errors")
+            print(json.dumps(report))
+            for error in errors:
+                print(f"  row {error['row']}: {error['error']}")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a CSV or NDJSON supplier catalog into products")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="defaults to the file extension")
+    parser.add_argument("--job-id", help="resume an interrupted import")
+    args = parser.parse_args()
+    fmt = args.format or ("ndjson" if args.path.suffix in (".ndjson", ".jsonl") else "csv")
+    asyncio.run(run_import(args.path, fmt, args.job_id))
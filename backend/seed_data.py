@@ -28,7 +28,9 @@ async def seed_database():
         "first_name": "Admin",
         "last_name": "User",
         "is_admin": True,
-        "created_at": "2025-01-01T00:00:00+00:00"
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "email_lc": "admin@lumina.com",
+        "name_lc": "admin user"
     }
     await db.users.insert_one(admin_user)
     
@@ -40,7 +42,9 @@ async def seed_database():
         "first_name": "Test",
         "last_name": "User",
         "is_admin": False,
-        "created_at": "2025-01-01T00:00:00+00:00"
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "email_lc": "user@test.com",
+        "name_lc": "test user"
     }
     await db.users.insert_one(test_user)
     
@@ -1,18 +1,81 @@
+import time
+_IMPORT_STARTED = time.perf_counter()  # first thing, so the startup report covers imports
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import CursorType, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, PyMongoError
+from cachetools import TTLCache
+import numpy as np
+import asyncio
+import base64
+import bisect
+import contextvars
+import csv
+import hashlib
+import io
+import itertools
+import json
+import math
+import mmap
+import random
+import re
+import socket
+import struct
+import sys
 import os
+import tempfile
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import List, Optional, Dict, Any, Callable, Iterator, AsyncIterator, IO
 import uuid
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 import jwt
+
+class StartupProfile:
+    """Wall-clock breakdown of process start, from the first import until the worker is ready."""
+
+    def __init__(self, started: float):
+        self._started = self._last = started
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.last_error: Optional[str] = None
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    async def step(self, name: str, func: Callable[[], Any]):
+        started = time.perf_counter()
+        result = await func()
+        self.phases[f"warmup.{name}"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def finish(self):
+        self.ready = True
+        self._last = time.perf_counter()
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "phases_ms": dict(self.phases),
+            "last_error": self.last_error,
+            "total_ms": round((self._last - self._started) * 1000, 1) if self.ready else None
+        }
+
+startup_profile = StartupProfile(_IMPORT_STARTED)
+startup_profile.mark("imports")
+
 # from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 class StripeCheckout:
     pass
@@ -31,11 +94,20 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# connect=False defers server discovery and the pool to the first operation (the warm-up ping)
+client = AsyncIOMotorClient(mongo_url, connect=False)
+# Routes use `db`, the profiled wrapper defined under QUERY PROFILING; internal
+# bookkeeping that should not show up in query stats uses `raw_db` directly
+raw_db = client[os.environ['DB_NAME']]
+
+# Password hashing; the context is built on first use and warmed up before readiness
+_pwd_context: Optional[CryptContext] = None
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def get_pwd_context() -> CryptContext:
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 # JWT settings
 JWT_SECRET = os.environ.get('JWT_SECRET')
@@ -53,31 +125,42 @@ security = HTTPBearer()
 async def lifespan(app: FastAPI):
     # Startup code (if any)
     print("Starting up...")
-    # If your DB client needs async startup, do it here
-    # e.g., await client.connect()
+    # Map whatever snapshot is on disk first so degraded reads work from the start
+    catalog_snapshot.refresh()
+    # Warm up in the background: the port opens right away and readiness flips when done
+    warm_up_task = asyncio.create_task(warm_up())
     
     yield  # <-- FastAPI runs your app here
 
     # Shutdown code
     print("Shutting down...")
+    warm_up_task.cancel()
+    await asyncio.gather(warm_up_task, return_exceptions=True)
+    await stop_services(TASK_DRAIN_SECONDS)
     client.close()  # safely closes the DB client
 
 app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
+startup_profile.mark("setup")
 
 # ============ MODELS ============
 
-class UserCreate(BaseModel):
+class AppModel(BaseModel):
+    # Validators are built on first use instead of at import; models used by routes
+    # are still built when their route is registered
+    model_config = ConfigDict(defer_build=True)
+
+class UserCreate(AppModel):
     email: EmailStr
     password: str
     first_name: str
     last_name: str
 
-class UserLogin(BaseModel):
+class UserLogin(AppModel):
     email: EmailStr
     password: str
 
-class User(BaseModel):
+class User(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     email: EmailStr
@@ -86,7 +169,7 @@ class User(BaseModel):
     is_admin: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-class Address(BaseModel):
+class Address(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -97,17 +180,17 @@ class Address(BaseModel):
     country: str
     is_default: bool = False
 
-class ProductVariation(BaseModel):
+class ProductVariation(AppModel):
     name: str  # e.g., "Size", "Color"
     value: str  # e.g., "Large", "Red"
     price_adjustment: float = 0.0
     stock: int = 0
 
-class ProductImage(BaseModel):
+class ProductImage(AppModel):
     url: str
     alt: str = ""
 
-class Product(BaseModel):
+class Product(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -121,9 +204,13 @@ class Product(BaseModel):
     rating: float = 0.0
     review_count: int = 0
     featured: bool = False
+    sku: Optional[str] = None  # supplier key used by catalog imports
+    units_sold: int = 0
+    sales_7d: int = 0
+    sales_30d: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-class ProductCreate(BaseModel):
+class ProductCreate(AppModel):
     name: str
     description: str
     base_price: float
@@ -133,22 +220,30 @@ class ProductCreate(BaseModel):
     variations: List[ProductVariation] = []
     stock: int = 0
     featured: bool = False
+    sku: Optional[str] = None
+
+class ProductUpsert(ProductCreate):
+    id: Optional[str] = None  # omitted for new products
 
-class Category(BaseModel):
+class Category(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     slug: str
     image_url: str = ""
     description: str = ""
+    # Maintained from product writes; not accepted from clients
+    product_count: int = 0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
 
-class CartItem(BaseModel):
+class CartItem(AppModel):
     product_id: str
     quantity: int
     variation: Optional[ProductVariation] = None
     price: float
 
-class Cart(BaseModel):
+class Cart(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: Optional[str] = None
@@ -156,14 +251,14 @@ class Cart(BaseModel):
     items: List[CartItem] = []
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-class OrderItem(BaseModel):
+class OrderItem(AppModel):
     product_id: str
     product_name: str
     quantity: int
     price: float
     variation: Optional[ProductVariation] = None
 
-class ShippingInfo(BaseModel):
+class ShippingInfo(AppModel):
     first_name: str
     last_name: str
     email: EmailStr
@@ -174,7 +269,7 @@ class ShippingInfo(BaseModel):
     country: str
     phone: str = ""
 
-class Order(BaseModel):
+class Order(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     order_number: str = Field(default_factory=lambda: f"ORD-{uuid.uuid4().hex[:8].upper()}")
@@ -185,19 +280,29 @@ class Order(BaseModel):
     tax: float
     shipping_cost: float
     total: float
+    discount: float = 0.0
+    coupon_code: Optional[str] = None
     status: str = "pending"  # pending, processing, shipped, delivered, cancelled
     payment_status: str = "pending"  # pending, paid, failed
     payment_session_id: Optional[str] = None
     shipping_method: str = "standard"
+    item_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-class OrderCreate(BaseModel):
+class OrderCreate(AppModel):
     items: List[CartItem]
     shipping_info: ShippingInfo
     shipping_method: str = "standard"
+    coupon_code: Optional[str] = None
+
+ORDER_STATUSES = ["pending", "processing", "shipped", "delivered", "cancelled"]
 
-class Review(BaseModel):
+class OrderStatusUpdate(AppModel):
+    order_id: str
+    status: str
+
+class Review(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     product_id: str
@@ -207,18 +312,18 @@ class Review(BaseModel):
     comment: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-class ReviewCreate(BaseModel):
+class ReviewCreate(AppModel):
     product_id: str
     rating: int
     comment: str
 
-class Wishlist(BaseModel):
+class Wishlist(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     product_ids: List[str] = []
 
-class Coupon(BaseModel):
+class Coupon(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     code: str
@@ -228,7 +333,7 @@ class Coupon(BaseModel):
     expiry_date: Optional[datetime] = None
     is_active: bool = True
 
-class PaymentTransaction(BaseModel):
+class PaymentTransaction(AppModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     order_id: str
@@ -239,13 +344,736 @@ class PaymentTransaction(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+startup_profile.mark("models")
+
+# ============ QUERY PROFILING ============
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+EXPLAIN_SAMPLE_RATE = float(os.environ.get('EXPLAIN_SAMPLE_RATE', 0.1))
+EXPLAIN_MIN_INTERVAL_SECONDS = 300  # per query shape
+PROFILER_MAX_SHAPES = 2000
+SLOW_QUERY_COLLECTION = "slow_queries"
+QUERY_PLAN_COLLECTION = "query_plans"
+PROFILER_CAP_BYTES = 16 * 1024 * 1024
+
+current_route: contextvars.ContextVar[str] = contextvars.ContextVar("current_route", default="-")
+
+def query_shape(value: Any) -> Any:
+    """Replace literal values with '?' so queries differing only in values group together."""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Keep the structure of $or/$and clauses and pipelines, collapse value lists
+        if value and all(isinstance(v, dict) for v in value):
+            return [query_shape(v) for v in value]
+        return "?"
+    return "?"
+
+class QueryProfiler:
+    """Times collection operations and aggregates them by normalized query shape.
+
+    Operations slower than SLOW_QUERY_MS are written to a capped collection with
+    the route that issued them, and a sample of slow read shapes gets an explain()
+    plan stored alongside. Stats are per worker process.
+    """
+
+    def __init__(self, database):
+        self._db = database
+        self.shapes: Dict[str, dict] = {}
+        self.dropped_shapes = 0
+        self._pending: set = set()
+
+    def record(self, collection: str, operation: str, spec: dict, elapsed_ms: float):
+        shape = {"filter": query_shape(spec.get("filter") or {})}
+        if spec.get("sort"):
+            shape["sort"] = spec["sort"]
+        if spec.get("pipeline"):
+            shape["pipeline"] = query_shape(spec["pipeline"])
+        shape_key = f"{collection}.{operation} {json.dumps(shape, sort_keys=True, default=str)}"
+        route = current_route.get()
+        
+        stats = self.shapes.get(shape_key)
+        if stats is None:
+            if len(self.shapes) >= PROFILER_MAX_SHAPES:
+                self.dropped_shapes += 1
+                return
+            stats = self.shapes[shape_key] = {
+                "shape": shape_key,
+                "collection": collection,
+                "operation": operation,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "slow_count": 0,
+                "last_route": route,
+                "last_explained": 0.0,
+            }
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["last_route"] = route
+        if elapsed_ms < SLOW_QUERY_MS:
+            return
+        
+        stats["slow_count"] += 1
+        logger.warning(f"Slow query {elapsed_ms:.1f}ms on {route}: {shape_key}")
+        self._spawn(self._db[SLOW_QUERY_COLLECTION].insert_one({
+            "shape": shape_key,
+            "route": route,
+            "duration_ms": round(elapsed_ms, 2),
+            "ts": datetime.now(timezone.utc),
+        }))
+        now = time.monotonic()
+        explain_command = self._explain_command(collection, operation, spec)
+        if (explain_command and random.random() < EXPLAIN_SAMPLE_RATE
+                and now - stats["last_explained"] > EXPLAIN_MIN_INTERVAL_SECONDS):
+            stats["last_explained"] = now
+            self._spawn(self._store_plan(shape_key, route, explain_command))
+
+    @staticmethod
+    def _explain_command(collection: str, operation: str, spec: dict) -> Optional[dict]:
+        if operation in ("find", "find_one"):
+            command = {"find": collection, "filter": spec.get("filter") or {}}
+            if spec.get("sort"):
+                command["sort"] = {k: d for k, d in spec["sort"]}
+            # Without the limit and projection the plan would describe a full scan the route never runs
+            if operation == "find_one":
+                command["limit"] = 1
+            elif spec.get("limit"):
+                command["limit"] = spec["limit"]
+            if spec.get("skip"):
+                command["skip"] = spec["skip"]
+            if spec.get("projection"):
+                command["projection"] = spec["projection"]
+            return command
+        if operation == "count_documents":
+            return {"count": collection, "query": spec.get("filter") or {}}
+        if operation == "aggregate":
+            return {"aggregate": collection, "pipeline": spec.get("pipeline", []), "cursor": {}}
+        return None
+
+    async def _store_plan(self, shape_key: str, route: str, command: dict):
+        plan = await self._db.command({"explain": command, "verbosity": "executionStats"})
+        await self._db[QUERY_PLAN_COLLECTION].insert_one({
+            "shape": shape_key,
+            "route": route,
+            "query_planner": plan.get("queryPlanner", {}),
+            "execution_stats": plan.get("executionStats", {}),
+            "ts": datetime.now(timezone.utc),
+        })
+
+    def _spawn(self, coro):
+        # Profiler writes never block or fail the request that triggered them
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Query profiler write failed: {task.exception()}")
+
+    async def start(self):
+        for name in (SLOW_QUERY_COLLECTION, QUERY_PLAN_COLLECTION):
+            try:
+                await self._db.create_collection(name, capped=True, size=PROFILER_CAP_BYTES)
+            except CollectionInvalid:
+                pass
+            except PyMongoError as e:
+                logger.warning(f"Could not create {name}: {e}")
+
+    def top_shapes(self, limit: int) -> List[dict]:
+        ranked = sorted(self.shapes.values(), key=lambda s: s["total_ms"], reverse=True)[:limit]
+        return [
+            {
+                **{k: v for k, v in stats.items() if k != "last_explained"},
+                "total_ms": round(stats["total_ms"], 2),
+                "max_ms": round(stats["max_ms"], 2),
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+            }
+            for stats in ranked
+        ]
+
+class ProfiledCursor:
+    """Wraps a Motor cursor, remembering sort options and timing its fetches."""
+
+    def __init__(self, cursor, collection: str, operation: str, spec: dict):
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+        self._spec = spec
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            keys = [(key_or_list, 1 if direction is None else direction)]
+        else:
+            keys = list(key_or_list)
+        self._cursor = self._cursor.sort(keys)
+        self._spec["sort"] = [list(key) for key in keys]
+        return self
+
+    def skip(self, count: int):
+        self._cursor = self._cursor.skip(count)
+        self._spec["skip"] = count
+        return self
+
+    def limit(self, count: int):
+        self._cursor = self._cursor.limit(count)
+        self._spec["limit"] = count
+        return self
+
+    async def to_list(self, length: Optional[int]):
+        started = time.perf_counter()
+        try:
+            return await self._cursor.to_list(length)
+        finally:
+            query_profiler.record(self._collection, self._operation, self._spec, (time.perf_counter() - started) * 1000)
+
+    async def __aiter__(self):
+        started = time.perf_counter()
+        try:
+            async for doc in self._cursor:
+                yield doc
+        finally:
+            query_profiler.record(self._collection, self._operation, self._spec, (time.perf_counter() - started) * 1000)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class ProfiledCollection:
+    TIMED_METHODS = {
+        "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+        "delete_one", "delete_many", "count_documents", "estimated_document_count", "distinct",
+        "find_one_and_update", "find_one_and_delete", "find_one_and_replace", "bulk_write",
+    }
+    # Methods whose first argument is a document or operation list, not a filter
+    UNFILTERED_METHODS = {"insert_one", "insert_many", "bulk_write", "estimated_document_count"}
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    @staticmethod
+    def _projection(args: tuple, kwargs: dict) -> Optional[dict]:
+        projection = args[0] if args else kwargs.get("projection")
+        if projection is None or isinstance(projection, dict):
+            return projection
+        return {field: 1 for field in projection}
+
+    def find(self, filter: Optional[dict] = None, *args, **kwargs):
+        spec = {"filter": filter or {}}
+        if kwargs.get("sort"):
+            spec["sort"] = [list(key) for key in kwargs["sort"]]
+        for option in ("limit", "skip"):
+            if kwargs.get(option):
+                spec[option] = kwargs[option]
+        spec["projection"] = self._projection(args, kwargs)
+        return ProfiledCursor(self._collection.find(filter, *args, **kwargs), self._collection.name, "find", spec)
+
+    def aggregate(self, pipeline: list, *args, **kwargs):
+        return ProfiledCursor(self._collection.aggregate(pipeline, *args, **kwargs), self._collection.name, "aggregate", {"pipeline": pipeline})
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self.TIMED_METHODS:
+            return attr
+        
+        async def timed(*args, **kwargs):
+            spec = {}
+            if name not in self.UNFILTERED_METHODS:
+                spec["filter"] = args[0] if args and isinstance(args[0], dict) else kwargs.get("filter")
+            if kwargs.get("sort"):
+                spec["sort"] = [list(key) for key in kwargs["sort"]]
+            if name == "find_one":
+                spec["projection"] = self._projection(args[1:], kwargs)
+            started = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                query_profiler.record(self._collection.name, name, spec, (time.perf_counter() - started) * 1000)
+        return timed
+
+class ProfiledDatabase:
+    """Drop-in for the Motor database handle that returns profiled collections."""
+
+    def __init__(self, database):
+        self._db = database
+
+    def __getitem__(self, name: str) -> ProfiledCollection:
+        return ProfiledCollection(self._db[name])
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        # Motor resolves unknown attributes to collections
+        if hasattr(attr, "find_one"):
+            return ProfiledCollection(attr)
+        return attr
+
+query_profiler = QueryProfiler(raw_db)
+db = ProfiledDatabase(raw_db)
+
+async def track_route(request: Request):
+    # Router-level dependency: runs in the endpoint's task, so the profiler sees the route
+    route = request.scope.get("route")
+    current_route.set(f"{request.method} {route.path if route else request.url.path}")
+
+# ============ CROSS-WORKER INVALIDATION ============
+
+# Every worker process gets its own id so it can skip events it published itself
+WORKER_ID = uuid.uuid4().hex
+INVALIDATION_COLLECTION = "invalidation_events"
+INVALIDATION_CAP_BYTES = int(os.environ.get('INVALIDATION_CAP_BYTES', 1024 * 1024))
+INVALIDATION_MAX_KEYS = 1000
+INVALIDATION_POLL_SECONDS = float(os.environ.get('INVALIDATION_POLL_SECONDS', 1.0))
+# Events are re-read with this much overlap so clock skew between workers can't hide them
+INVALIDATION_OVERLAP_SECONDS = 5.0
+
+class InvalidationBus:
+    """Fans in-process cache invalidations out to every worker.
+
+    Events are appended to a small capped collection. Each worker tails it with a
+    tailable cursor and falls back to polling when tailing is not available, so an
+    invalidation published in one worker reaches the others within roughly
+    INVALIDATION_POLL_SECONDS.
+    """
+
+    def __init__(self, database):
+        self._db = database
+        self._handlers: Dict[str, List[Callable[[List[str]], None]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_ts = datetime.now(timezone.utc)
+        self._seen: Dict[Any, datetime] = {}
+        self.mode = "stopped"
+
+    def subscribe(self, topic: str, handler: Callable[[List[str]], None]):
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def publish(self, topic: str, keys: Optional[List[str]] = None, apply_locally: bool = True):
+        # An empty key list means "everything under this topic"
+        keys = keys or []
+        if len(keys) > INVALIDATION_MAX_KEYS:
+            keys = []
+        # Apply locally right away; the listener skips our own events
+        if apply_locally:
+            self._dispatch(topic, keys)
+        try:
+            await self._db[INVALIDATION_COLLECTION].insert_one({
+                "topic": topic,
+                "keys": keys,
+                "worker": WORKER_ID,
+                "ts": datetime.now(timezone.utc),
+            })
+        except PyMongoError as e:
+            logger.warning(f"Failed to publish invalidation for {topic}: {e}")
+
+    def _dispatch(self, topic: str, keys: List[str]):
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(keys)
+            except Exception:
+                logger.exception(f"Invalidation handler for {topic} failed")
+
+    def _handle(self, event: dict):
+        if event["_id"] in self._seen:
+            return
+        self._seen[event["_id"]] = event["ts"]
+        self._last_ts = max(self._last_ts, event["ts"].replace(tzinfo=timezone.utc))
+        if event.get("worker") != WORKER_ID and event.get("topic"):
+            self._dispatch(event["topic"], event.get("keys", []))
+
+    def _since_query(self) -> dict:
+        since = self._last_ts - timedelta(seconds=INVALIDATION_OVERLAP_SECONDS)
+        # Forget ids that have dropped out of the overlap window
+        self._seen = {k: ts for k, ts in self._seen.items() if ts.replace(tzinfo=timezone.utc) >= since}
+        return {"ts": {"$gte": since}}
+
+    async def start(self):
+        try:
+            await self._db.create_collection(INVALIDATION_COLLECTION, capped=True, size=INVALIDATION_CAP_BYTES)
+        except CollectionInvalid:
+            pass  # already created by another worker
+        except PyMongoError as e:
+            logger.warning(f"Could not create {INVALIDATION_COLLECTION}: {e}")
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.mode = "stopped"
+
+    async def _listen(self):
+        collection = self._db[INVALIDATION_COLLECTION]
+        self.mode = "tailing"
+        while True:
+            if self.mode == "tailing":
+                try:
+                    cursor = collection.find(self._since_query(), cursor_type=CursorType.TAILABLE_AWAIT)
+                    while cursor.alive:
+                        async for event in cursor:
+                            self._handle(event)
+                        await asyncio.sleep(INVALIDATION_POLL_SECONDS)
+                except PyMongoError as e:
+                    logger.warning(f"Tailing {INVALIDATION_COLLECTION} unavailable, polling instead: {e}")
+                    self.mode = "polling"
+            else:
+                try:
+                    async for event in collection.find(self._since_query()).sort("ts", 1):
+                        self._handle(event)
+                except PyMongoError as e:
+                    logger.warning(f"Polling {INVALIDATION_COLLECTION} failed: {e}")
+            # A tailable cursor dies when the collection is empty; re-open after a pause
+            await asyncio.sleep(INVALIDATION_POLL_SECONDS)
+
+invalidation_bus = InvalidationBus(raw_db)
+
+# Storefront reads that rarely change are cached per worker and dropped on invalidation
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL_SECONDS', 60))
+catalog_cache = TTLCache(maxsize=256, ttl=CATALOG_CACHE_TTL)
+
+def _invalidate_catalog_cache(prefix: str):
+    for key in [k for k in catalog_cache if k.startswith(prefix)]:
+        catalog_cache.pop(key, None)
+
+invalidation_bus.subscribe("products", lambda keys: _invalidate_catalog_cache("products:"))
+invalidation_bus.subscribe("categories", lambda keys: _invalidate_catalog_cache("categories:"))
+
+# ============ DATABASE SETUP ============
+
+# Fields served by the order-history list; the index below covers all of them
+ORDER_SUMMARY_FIELDS = ["id", "order_number", "status", "payment_status", "total", "item_count", "created_at"]
+
+async def ensure_indexes():
+    # create_index is a no-op when the index already exists, so every worker can run this
+    await db.orders.create_index(
+        [("user_id", 1), ("created_at", -1), ("id", 1)]
+        + [(field, 1) for field in ORDER_SUMMARY_FIELDS if field not in ("id", "created_at")],
+        name="order_history_summary"
+    )
+    await db.orders.create_index("id", unique=True)
+    await db.products.create_index("id", unique=True)
+    await db.products.create_index(
+        "sku", unique=True, partialFilterExpression={"sku": {"$type": "string"}}
+    )
+    await db.import_jobs.create_index("id", unique=True)
+    await db.related_products.create_index("product_id", unique=True)
+    await db.coupons.create_index("code", unique=True)
+    await raw_db[IDEMPOTENCY_COLLECTION].create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL)
+    await raw_db[WORKER_STATS_COLLECTION].create_index(
+        "updated_at", expireAfterSeconds=max(1, int(WORKER_STATS_INTERVAL * WORKER_STATS_STALE_INTERVALS))
+    )
+    await db.categories.create_index("name")
+    await db.products.create_index([("units_sold", -1)])
+    await raw_db[ORDER_ARCHIVE_COLLECTION].create_index(
+        [("user_id", 1), ("created_at", -1), ("_id", 1)] + [(field, 1) for field in ("order_number", "status", "payment_status", "total", "item_count")],
+        name="order_history_summary"
+    )
+    await raw_db[ORDER_ARCHIVE_COLLECTION].create_index([("created_at", -1), ("_id", 1)])
+    await raw_db[ORDER_ARCHIVE_COLLECTION].create_index([("status", 1), ("created_at", -1), ("_id", 1)])
+    # Admin order list (optionally by status) and the archive job's batch query
+    await db.orders.create_index([("created_at", -1), ("id", 1)])
+    await db.orders.create_index([("status", 1), ("created_at", -1), ("id", 1)])
+    await db.products.create_index([("sales_7d", -1)])
+    await db.sales_daily.create_index([("product_id", 1), ("day", 1)], unique=True)
+    await db.sales_daily.create_index("day", expireAfterSeconds=SALES_DAILY_RETENTION_DAYS * 86400)
+    await db.product_cooccurrence.create_index("product_id", unique=True)
+    await db.users.create_index("id", unique=True)
+    await db.users.create_index("email")
+    await db.users.create_index([("created_at", -1), ("id", 1)])
+    for search_field in USER_SEARCH_FIELDS.values():
+        await db.users.create_index([(search_field, 1), ("id", 1)])
+
+# ============ PERIODIC JOBS ============
+
+JOB_LOCK_COLLECTION = "job_locks"
+
+async def acquire_job_lease(name: str, seconds: float) -> bool:
+    """Claim `name` for `seconds`; only one worker across the deployment wins each period."""
+    now = datetime.now(timezone.utc)
+    try:
+        await raw_db[JOB_LOCK_COLLECTION].update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lte": now}}, {"owner": WORKER_ID}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and is held by another worker, so the upsert collided
+        return False
+
+class PeriodicJobs:
+    """Runs registered coroutines every `interval` seconds on one worker at a time."""
+
+    def __init__(self):
+        self._jobs: Dict[str, tuple] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.stats: Dict[str, dict] = {}
+
+    def register(self, name: str, interval: float, job: Callable[[], Any]):
+        if interval <= 0:
+            return  # disabled
+        self._jobs[name] = (interval, job)
+        self.stats[name] = {"interval_seconds": interval, "runs": 0, "last_run": None, "last_duration_ms": None, "last_error": None}
+
+    async def run(self, name: str):
+        interval, job = self._jobs[name]
+        stats = self.stats[name]
+        started = time.perf_counter()
+        try:
+            result = await job()
+            stats["last_error"] = None
+            logger.info(f"Job {name} finished: {result}")
+        except Exception as e:
+            stats["last_error"] = str(e)
+            logger.exception(f"Job {name} failed")
+        stats["runs"] += 1
+        stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        stats["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _loop(self, name: str):
+        interval, _ = self._jobs[name]
+        while True:
+            try:
+                if await acquire_job_lease(name, interval):
+                    await self.run(name)
+            except PyMongoError as e:
+                logger.warning(f"Job {name} skipped: {e}")
+            # Jitter keeps workers from hitting the lease at the same instant
+            await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._loop(name)) for name in self._jobs]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+periodic_jobs = PeriodicJobs()
+
+# ============ WORKER STATS ============
+
+WORKER_STATS_COLLECTION = "worker_stats"
+WORKER_STATS_INTERVAL = float(os.environ.get('WORKER_STATS_INTERVAL_SECONDS', 30))
+# Workers that miss this many publishes are left out of the reports
+WORKER_STATS_STALE_INTERVALS = 3
+PROFILER_PUBLISH_SHAPES = 200
+
+class WorkerStats:
+    """Shares each worker's in-process counters so admin reports cover the whole deployment.
+
+    Every WORKER_STATS_INTERVAL each worker replaces its own document, keyed by
+    WORKER_ID, with the output of the registered providers. Reports read every
+    worker's latest document and take this worker's numbers fresh; documents of
+    workers that stopped publishing expire through a TTL index.
+    """
+
+    def __init__(self, database):
+        self._db = database
+        self._providers: Dict[str, Callable[[], dict]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, provider: Callable[[], dict]):
+        self._providers[name] = provider
+
+    def _document(self) -> dict:
+        return {
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "updated_at": datetime.now(timezone.utc),
+            **{name: provider() for name, provider in self._providers.items()}
+        }
+
+    async def publish(self):
+        await self._db[WORKER_STATS_COLLECTION].replace_one({"_id": WORKER_ID}, self._document(), upsert=True)
+
+    async def collect(self, name: str) -> List[dict]:
+        """The `name` stats of every live worker, this one first."""
+        fresh_after = datetime.now(timezone.utc) - timedelta(seconds=WORKER_STATS_INTERVAL * WORKER_STATS_STALE_INTERVALS)
+        others = await self._db[WORKER_STATS_COLLECTION].find(
+            {"_id": {"$ne": WORKER_ID}, "updated_at": {"$gte": fresh_after}},
+            {"host": 1, "pid": 1, "updated_at": 1, name: 1}
+        ).to_list(None)
+        local = {"_id": WORKER_ID, "host": socket.gethostname(), "pid": os.getpid(),
+                 "updated_at": datetime.now(timezone.utc), name: self._providers[name]()}
+        return [
+            {"worker": doc["_id"], "host": doc.get("host"), "pid": doc.get("pid"),
+             "updated_at": doc["updated_at"], "stats": doc.get(name)}
+            for doc in [local, *others]
+        ]
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.publish()
+            except PyMongoError as e:
+                logger.warning(f"Could not publish worker stats: {e}")
+            await asyncio.sleep(WORKER_STATS_INTERVAL)
+
+    async def start(self):
+        if WORKER_STATS_INTERVAL > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            try:
+                await self._db[WORKER_STATS_COLLECTION].delete_one({"_id": WORKER_ID})
+            except PyMongoError:
+                pass
+
+worker_stats = WorkerStats(raw_db)
+worker_stats.register("queries", lambda: {
+    "tracked_shapes": len(query_profiler.shapes),
+    "dropped_shapes": query_profiler.dropped_shapes,
+    "shapes": query_profiler.top_shapes(PROFILER_PUBLISH_SHAPES)
+})
+
+# ============ DATA MIGRATIONS ============
+
+MIGRATION_COLLECTION = "migrations"
+MIGRATION_INTERVAL = float(os.environ.get('MIGRATION_INTERVAL_SECONDS', 3600))
+
+async def backfill_order_item_count():
+    # Orders written before item_count existed
+    await raw_db.orders.update_many(
+        {"item_count": {"$exists": False}},
+        [{"$set": {"item_count": {"$sum": "$items.quantity"}}}]
+    )
+
+async def backfill_user_search_fields():
+    # Users registered before the admin directory's search fields existed
+    await raw_db.users.update_many(
+        {"email_lc": {"$exists": False}},
+        [{"$set": {
+            "email_lc": {"$toLower": "$email"},
+            "name_lc": {"$toLower": {"$concat": ["$first_name", " ", "$last_name"]}}
+        }}]
+    )
+
+# Applied in order, each once per database; a failed one is retried on the next run
+MIGRATIONS: List[tuple] = [
+    ("orders_item_count", backfill_order_item_count),
+    ("users_search_fields", backfill_user_search_fields),
+]
+
+async def run_migrations() -> dict:
+    """Apply pending one-off data backfills, off the readiness path and on one worker."""
+    applied = {doc["_id"] async for doc in raw_db[MIGRATION_COLLECTION].find({}, {"_id": 1})}
+    ran = []
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+        await migration()
+        await raw_db[MIGRATION_COLLECTION].insert_one({"_id": name, "applied_at": datetime.now(timezone.utc)})
+        ran.append(name)
+    return {"applied": ran}
+
+periodic_jobs.register("migrations", MIGRATION_INTERVAL, run_migrations)
+
+# ============ BACKGROUND TASKS ============
+
+TASK_QUEUE_SIZE = int(os.environ.get('TASK_QUEUE_SIZE', 10000))
+TASK_CONCURRENCY = int(os.environ.get('TASK_CONCURRENCY', 8))
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_BASE_SECONDS = 0.5
+TASK_DRAIN_SECONDS = float(os.environ.get('TASK_DRAIN_SECONDS', 30))
+
+class BackgroundTaskRunner:
+    """Bounded in-process queue for side effects that don't need to block a response.
+
+    Tasks are retried with exponential backoff unless enqueued with attempts=1, which
+    is for tasks that are not safe to repeat. When the runner isn't started, is
+    draining, or its queue is full, `enqueue` runs the task inline instead. Tasks
+    still queued when `drain` times out at shutdown are logged and dropped.
+    """
+
+    def __init__(self, max_queue: int, concurrency: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._concurrency = concurrency
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+        self.metrics: Dict[str, dict] = {}
+
+    def _metrics_for(self, name: str) -> dict:
+        return self.metrics.setdefault(name, {"queued": 0, "inline": 0, "succeeded": 0, "retried": 0, "failed": 0})
+
+    async def enqueue(self, name: str, func: Callable, *args, attempts: int = TASK_MAX_ATTEMPTS):
+        metrics = self._metrics_for(name)
+        if self._accepting:
+            try:
+                self._queue.put_nowait((name, func, args, attempts))
+                metrics["queued"] += 1
+                return
+            except asyncio.QueueFull:
+                pass
+        metrics["inline"] += 1
+        await self._run(name, func, args, attempts)
+
+    async def _run(self, name: str, func: Callable, args: tuple, attempts: int):
+        metrics = self._metrics_for(name)
+        for attempt in range(1, attempts + 1):
+            try:
+                await func(*args)
+                metrics["succeeded"] += 1
+                return
+            except Exception:
+                if attempt == attempts:
+                    metrics["failed"] += 1
+                    logger.exception(f"Background task {name} failed after {attempt} attempts")
+                    return
+                metrics["retried"] += 1
+                await asyncio.sleep(TASK_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+
+    async def _worker(self):
+        while True:
+            name, func, args, attempts = await self._queue.get()
+            try:
+                await self._run(name, func, args, attempts)
+            finally:
+                self._queue.task_done()
+
+    async def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._concurrency)]
+        self._accepting = True
+
+    async def drain(self, timeout: float):
+        # New work runs inline from here on; wait for what is already queued
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            if self._queue.qsize():
+                logger.warning(f"Shutting down with {self._queue.qsize()} background tasks still queued")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "accepting": self._accepting,
+            "queue_size": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "concurrency": self._concurrency,
+            "tasks": self.metrics
+        }
+
+background_tasks = BackgroundTaskRunner(TASK_QUEUE_SIZE, TASK_CONCURRENCY)
+worker_stats.register("tasks", background_tasks.stats)
+
 # ============ AUTH HELPERS ============
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -275,9 +1103,740 @@ async def get_current_admin(current_user: dict = Depends(get_current_user)) -> d
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+# ============ PAGINATION HELPERS ============
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+# ============ BULK HELPERS ============
+
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 10000))
+
+def check_bulk_size(items: list):
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+
+def validation_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+async def run_bulk_write(collection, operations: list) -> tuple:
+    """Apply operations unordered; return ({upserted operation indices}, {operation index: error message})."""
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+        return set(result.upserted_ids), {}
+    except BulkWriteError as e:
+        # The operations that did succeed are still reported in the error details
+        upserted = {doc["index"] for doc in e.details.get("upserted", [])}
+        return upserted, {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+
+def bulk_summary(results: List[dict]) -> dict:
+    results.sort(key=lambda r: r["index"])
+    succeeded = sum(1 for r in results if r["ok"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+# ============ IDEMPOTENCY ============
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+# How long a duplicate waits for the first request before giving up with 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 10))
+# A key still in progress after this long is assumed abandoned by a crashed worker
+IDEMPOTENCY_LOCK_SECONDS = float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+IDEMPOTENCY_POLL_SECONDS = 0.2
+
+class IdempotencyStore:
+    """Replays the stored response for a repeated Idempotency-Key instead of redoing the work.
+
+    The first request claims the key by inserting an in-progress record; duplicates wait
+    for it to complete (on an in-process event, or by polling when the first request is
+    on another worker) and then return its stored response. If the first request fails the
+    record is removed, so a retry runs from scratch.
+    """
+
+    def __init__(self, database):
+        self._db = database
+        self._inflight: Dict[str, asyncio.Event] = {}
+
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+    async def _claim(self, record_id: str, fingerprint: str) -> Optional[dict]:
+        """Claim the key; return None when claimed, otherwise the existing record."""
+        now = datetime.now(timezone.utc)
+        locked_until = now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+        try:
+            await self._db[IDEMPOTENCY_COLLECTION].insert_one({
+                "_id": record_id, "fingerprint": fingerprint, "status": "in_progress",
+                "locked_until": locked_until, "created_at": now
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        existing = await self._db[IDEMPOTENCY_COLLECTION].find_one({"_id": record_id})
+        if existing is None:
+            return await self._claim(record_id, fingerprint)
+        if existing["status"] == "in_progress" and existing["locked_until"].replace(tzinfo=timezone.utc) <= now:
+            result = await self._db[IDEMPOTENCY_COLLECTION].update_one(
+                {"_id": record_id, "status": "in_progress", "locked_until": existing["locked_until"]},
+                {"$set": {"locked_until": locked_until}}
+            )
+            if result.modified_count:
+                return None
+        return existing
+
+    async def _wait(self, record_id: str) -> Optional[dict]:
+        """Wait for the in-progress request; None means it failed and the key is free again."""
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            event = self._inflight.get(record_id)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), deadline - time.monotonic())
+                else:
+                    await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                break
+            record = await self._db[IDEMPOTENCY_COLLECTION].find_one({"_id": record_id})
+            if record is None or record["status"] == "completed":
+                return record
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    async def run(self, request: Request, scope: str, payload: Any, handler: Callable[[], Any]):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return await handler()
+        if len(key) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+        record_id = f"{scope}:{key}"
+        fingerprint = self.fingerprint(payload)
+        while True:
+            existing = await self._claim(record_id, fingerprint)
+            if existing is None:
+                break
+            if existing["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            if existing["status"] == "in_progress":
+                existing = await self._wait(record_id)
+                if existing is None:
+                    continue
+            return JSONResponse(content=existing["response"], headers={"Idempotent-Replayed": "true"})
+
+        event = self._inflight[record_id] = asyncio.Event()
+        try:
+            response = await handler()
+        except BaseException:
+            await self._db[IDEMPOTENCY_COLLECTION].delete_one({"_id": record_id})
+            raise
+        else:
+            await self._db[IDEMPOTENCY_COLLECTION].update_one(
+                {"_id": record_id},
+                {"$set": {"status": "completed", "response": jsonable_encoder(response)}, "$unset": {"locked_until": ""}}
+            )
+            return response
+        finally:
+            self._inflight.pop(record_id, None)
+            event.set()
+
+idempotency = IdempotencyStore(raw_db)
+
+# ============ RATE LIMITING ============
+
+# "route=capacity/seconds" pairs; a bucket holds `capacity` tokens and refills over `seconds`
+DEFAULT_RATE_LIMITS = "login=10/60,register=5/60,product_search=60/60"
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 256))
+TRUST_PROXY_HEADERS = os.environ.get('TRUST_PROXY_HEADERS', 'false').lower() == 'true'
+RATE_LIMIT_MAX_KEYS = 100_000
+
+def parse_rate_limits(spec: str) -> Dict[str, tuple]:
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        route, rate = entry.split('=')
+        capacity, period = rate.split('/')
+        limits[route.strip()] = (float(capacity), float(period))
+    return limits
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+class RateLimiter:
+    """Per-route token buckets keyed by client IP and authenticated user.
+
+    Limits are enforced per worker process. Idle buckets expire after one refill
+    period, which is equivalent to them being full again, so memory stays bounded
+    by the number of recently active clients.
+    """
+
+    def __init__(self, limits: Dict[str, tuple]):
+        self.limits = limits
+        self._buckets = {
+            route: TTLCache(maxsize=RATE_LIMIT_MAX_KEYS, ttl=period)
+            for route, (_, period) in limits.items()
+        }
+        self.counters = {route: {"allowed": 0, "limited": 0} for route in limits}
+
+    def acquire(self, route: str, keys: List[str]) -> Optional[float]:
+        """Take one token from every key's bucket; return seconds to wait if any is empty."""
+        if route not in self.limits:
+            return None
+        capacity, period = self.limits[route]
+        refill_rate = capacity / period
+        now = time.monotonic()
+        buckets = []
+        for key in keys:
+            bucket = self._buckets[route].get(key)
+            if bucket is None:
+                bucket = TokenBucket(capacity, now)
+            else:
+                bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) * refill_rate)
+                bucket.updated = now
+            self._buckets[route][key] = bucket
+            buckets.append(bucket)
+        empty = [b for b in buckets if b.tokens < 1]
+        if empty:
+            self.counters[route]["limited"] += 1
+            return max((1 - b.tokens) / refill_rate for b in empty)
+        for bucket in buckets:
+            bucket.tokens -= 1
+        self.counters[route]["allowed"] += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            route: {
+                "capacity": capacity,
+                "period_seconds": period,
+                "tracked_keys": len(self._buckets[route]),
+                **self.counters[route],
+            }
+            for route, (capacity, period) in self.limits.items()
+        }
+
+class AdmissionController:
+    """Global in-flight request limit; requests over it are shed with 503."""
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def try_enter(self) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        self.admitted += 1
+        self.peak = max(self.peak, self.in_flight)
+        return True
+
+    def leave(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "peak": self.peak,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+rate_limiter = RateLimiter(parse_rate_limits(os.environ.get('RATE_LIMITS', DEFAULT_RATE_LIMITS)))
+admission = AdmissionController(MAX_CONCURRENT_REQUESTS)
+worker_stats.register("limits", lambda: {"rate_limits": rate_limiter.stats(), "admission": admission.stats()})
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def rate_limit(route: str, when: Optional[Callable[[Request], bool]] = None):
+    """Route dependency that rejects the request with 429 before the handler runs."""
+    async def dependency(request: Request):
+        if when is not None and not when(request):
+            return
+        keys = [f"ip:{client_ip(request)}"]
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            try:
+                payload = jwt.decode(authorization[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM])
+                if payload.get("user_id"):
+                    keys.append(f"user:{payload['user_id']}")
+            except jwt.PyJWTError:
+                pass
+        retry_after = rate_limiter.acquire(route, keys)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    return dependency
+
+# ============ TYPEAHEAD INDEX ============
+
+SUGGEST_MAX_ENTRIES = int(os.environ.get('SUGGEST_MAX_ENTRIES', 200_000))
+SUGGEST_SCAN_LIMIT = 2000  # prefix matches considered before ranking
+SUGGEST_MAX_RESULTS = 20
+
+class SuggestIndex:
+    """Prefix index over product names, brands and category names.
+
+    Every searchable word (and the full label) is kept in one sorted array of
+    (term, ref) pairs, so a prefix lookup is a bisect plus a short scan. Entries
+    are ranked by popularity: units sold, then rating. Product and category
+    invalidations reload just the changed documents; an empty key list rebuilds.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._terms: List[tuple] = []
+        self._entries: Dict[str, dict] = {}
+        self._brands: Dict[str, int] = {}  # brand label -> number of products
+        self._pending: Dict[str, set] = {"products": set(), "categories": set()}
+        self._rebuild_requested = False
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.built_at: Optional[str] = None
+
+    @staticmethod
+    def _terms_for(label: str) -> set:
+        label = label.lower().strip()
+        return ({label} | set(label.split())) if label else set()
+
+    def _add(self, ref: str, kind: str, label: str, score: tuple, entry_id: str):
+        self._remove(ref)
+        if len(self._entries) >= self.max_entries:
+            self.dropped += 1
+            return
+        terms = self._terms_for(label)
+        self._entries[ref] = {"type": kind, "id": entry_id, "label": label, "score": score, "terms": terms}
+        for term in terms:
+            bisect.insort(self._terms, (term, ref))
+
+    def _remove(self, ref: str):
+        entry = self._entries.pop(ref, None)
+        if not entry:
+            return
+        for term in entry["terms"]:
+            i = bisect.bisect_left(self._terms, (term, ref))
+            if i < len(self._terms) and self._terms[i] == (term, ref):
+                del self._terms[i]
+
+    def _set_product(self, product_id: str, product: Optional[dict]):
+        old = self._entries.get(f"product:{product_id}")
+        if old and old.get("brand"):
+            self._adjust_brand(old["brand"], -1)
+        if product is None:
+            self._remove(f"product:{product_id}")
+            return
+        score = (product.get("units_sold", 0), product.get("rating", 0.0))
+        self._add(f"product:{product_id}", "product", product["name"], score, product_id)
+        entry = self._entries.get(f"product:{product_id}")
+        if entry is not None and product.get("brand"):
+            entry["brand"] = product["brand"]
+            self._adjust_brand(product["brand"], 1)
+
+    def _adjust_brand(self, brand: str, delta: int):
+        count = self._brands.get(brand, 0) + delta
+        if count <= 0:
+            self._brands.pop(brand, None)
+            self._remove(f"brand:{brand}")
+        else:
+            self._brands[brand] = count
+            self._add(f"brand:{brand}", "brand", brand, (count, 0.0), brand)
+
+    def _set_category(self, category_id: str, category: Optional[dict]):
+        if category is None:
+            self._remove(f"category:{category_id}")
+            return
+        self._add(f"category:{category_id}", "category", category["name"], (category.get("product_count", 0), 0.0), category_id)
+
+    def suggest(self, prefix: str, limit: int) -> List[dict]:
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        matches = {}
+        i = bisect.bisect_left(self._terms, (prefix,))
+        end = min(len(self._terms), i + SUGGEST_SCAN_LIMIT)
+        while i < end and self._terms[i][0].startswith(prefix):
+            ref = self._terms[i][1]
+            matches[ref] = self._entries[ref]
+            i += 1
+        ranked = sorted(matches.values(), key=lambda e: e["score"], reverse=True)[:limit]
+        return [{"type": e["type"], "id": e["id"], "label": e["label"]} for e in ranked]
+
+    def _build(self, products: List[dict], categories: List[dict]) -> tuple:
+        """Build a complete index into fresh structures, sorting the term array once."""
+        entries: Dict[str, dict] = {}
+        brands: Dict[str, int] = {}
+        dropped = 0
+
+        def add(ref: str, entry: dict):
+            nonlocal dropped
+            if len(entries) >= self.max_entries:
+                dropped += 1
+                return
+            entry["terms"] = self._terms_for(entry["label"])
+            entries[ref] = entry
+
+        for product in products:
+            entry = {"type": "product", "id": product["id"], "label": product["name"],
+                     "score": (product.get("units_sold", 0), product.get("rating", 0.0))}
+            add(f"product:{product['id']}", entry)
+            if f"product:{product['id']}" in entries and product.get("brand"):
+                entry["brand"] = product["brand"]
+                brands[product["brand"]] = brands.get(product["brand"], 0) + 1
+        for brand, count in brands.items():
+            add(f"brand:{brand}", {"type": "brand", "id": brand, "label": brand, "score": (count, 0.0)})
+        for category in categories:
+            add(f"category:{category['id']}", {"type": "category", "id": category["id"], "label": category["name"],
+                                               "score": (category.get("product_count", 0), 0.0)})
+        terms = sorted((term, ref) for ref, entry in entries.items() for term in entry["terms"])
+        return terms, entries, brands, dropped
+
+    async def rebuild(self):
+        products = await raw_db.products.find({}, PRODUCT_SUGGEST_PROJECTION).to_list(None)
+        categories = await raw_db.categories.find({}, {"_id": 0, "id": 1, "name": 1, "product_count": 1}).to_list(None)
+        # Built off the event loop; the old index keeps serving until the swap
+        terms, entries, brands, dropped = await run_in_threadpool(self._build, products, categories)
+        self._terms, self._entries, self._brands, self.dropped = terms, entries, brands, dropped
+        self.built_at = datetime.now(timezone.utc).isoformat()
+
+    def invalidate(self, topic: str, keys: List[str]):
+        if keys:
+            self._pending[topic].update(keys)
+        else:
+            self._rebuild_requested = True
+        # Coalesce bursts of writes into one refresh
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def _refresh(self):
+        while self._rebuild_requested or any(self._pending.values()):
+            try:
+                if self._rebuild_requested:
+                    self._rebuild_requested = False
+                    self._pending = {"products": set(), "categories": set()}
+                    await self.rebuild()
+                    continue
+                product_ids, self._pending["products"] = list(self._pending["products"]), set()
+                category_ids, self._pending["categories"] = list(self._pending["categories"]), set()
+                if product_ids:
+                    found = {p["id"]: p for p in await raw_db.products.find({"id": {"$in": product_ids}}, PRODUCT_SUGGEST_PROJECTION).to_list(None)}
+                    for product_id in product_ids:
+                        self._set_product(product_id, found.get(product_id))
+                if category_ids:
+                    found = {c["id"]: c for c in await raw_db.categories.find({"id": {"$in": category_ids}}, {"_id": 0, "id": 1, "name": 1, "product_count": 1}).to_list(None)}
+                    for category_id in category_ids:
+                        self._set_category(category_id, found.get(category_id))
+            except PyMongoError as e:
+                logger.warning(f"Suggest index refresh failed: {e}")
+                return
+
+    def stats(self) -> dict:
+        term_bytes = sum(sys.getsizeof(term) + sys.getsizeof((term, ref)) for term, ref in self._terms)
+        entry_bytes = sum(sys.getsizeof(ref) + sys.getsizeof(e["label"]) + sys.getsizeof(e) for ref, e in self._entries.items())
+        return {
+            "entries": len(self._entries),
+            "terms": len(self._terms),
+            "max_entries": self.max_entries,
+            "dropped": self.dropped,
+            "approx_bytes": term_bytes + entry_bytes + sys.getsizeof(self._terms),
+            "built_at": self.built_at
+        }
+
+PRODUCT_SUGGEST_PROJECTION = {"_id": 0, "id": 1, "name": 1, "brand": 1, "units_sold": 1, "rating": 1}
+suggest_index = SuggestIndex(SUGGEST_MAX_ENTRIES)
+invalidation_bus.subscribe("products", lambda keys: suggest_index.invalidate("products", keys))
+invalidation_bus.subscribe("categories", lambda keys: suggest_index.invalidate("categories", keys))
+worker_stats.register("suggest", suggest_index.stats)
+
+# ============ CATALOG SNAPSHOT ============
+
+CATALOG_SNAPSHOT_PATH = Path(os.environ.get('CATALOG_SNAPSHOT_PATH', ROOT_DIR / 'catalog_snapshot.bin'))
+CATALOG_SNAPSHOT_INTERVAL = float(os.environ.get('CATALOG_SNAPSHOT_INTERVAL_SECONDS', 300))
+DB_HEALTH_INTERVAL = float(os.environ.get('DB_HEALTH_INTERVAL_SECONDS', 5))
+# Reads slower than this (or failing) switch the storefront to the snapshot
+DB_DEGRADED_LATENCY_MS = float(os.environ.get('DB_DEGRADED_LATENCY_MS', 500))
+SNAPSHOT_MAGIC = b"CATSNAP2"
+# magic, header length, product count, id width
+SNAPSHOT_PREAMBLE = struct.Struct("<8sIIH")
+SNAPSHOT_ENTRY = struct.Struct("<QI")  # record offset, record length; follows the padded id
+SNAPSHOT_RECORD_LENGTH = struct.Struct("<I")
+# Degraded listing scans at most this many of the newest products
+SNAPSHOT_SCAN_LIMIT = int(os.environ.get('SNAPSHOT_SCAN_LIMIT', 5000))
+
+def _snapshot_record(doc: dict) -> bytes:
+    return json.dumps(doc, separators=(",", ":"), default=str).encode()
+
+async def write_catalog_snapshot(path: Path = CATALOG_SNAPSHOT_PATH) -> dict:
+    """Serialize products and categories into the binary snapshot file.
+
+    Layout: a fixed preamble, a small JSON header (categories, featured ids), a table of
+    fixed-width (id, offset, length) entries sorted by id, then length-prefixed compact
+    JSON records in newest-first order. Readers binary-search the table inside the
+    mapping, so no per-worker index is built. The file is written beside the old one and
+    swapped in with os.replace, so workers still mapping the previous file keep a
+    consistent copy.
+    """
+    products = await raw_db.products.find({}, {"_id": 0}).sort("created_at", -1).to_list(None)
+    categories = await raw_db.categories.find({}, {"_id": 0}).to_list(None)
+    header = _snapshot_record({
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "categories": categories,
+        "featured": [p["id"] for p in products if p.get("featured")][:8]
+    })
+
+    def write() -> int:
+        records, entries, offset = [], [], 0
+        for product in products:
+            record = _snapshot_record(product)
+            records.append(SNAPSHOT_RECORD_LENGTH.pack(len(record)) + record)
+            entries.append((product["id"].encode(), offset + SNAPSHOT_RECORD_LENGTH.size, len(record)))
+            offset += SNAPSHOT_RECORD_LENGTH.size + len(record)
+        entries.sort()
+        id_width = max((len(product_id) for product_id, _, _ in entries), default=0)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, delete=False) as tmp:
+            tmp.write(SNAPSHOT_PREAMBLE.pack(SNAPSHOT_MAGIC, len(header), len(entries), id_width))
+            tmp.write(header)
+            for product_id, record_offset, length in entries:
+                tmp.write(product_id.ljust(id_width, b"\0") + SNAPSHOT_ENTRY.pack(record_offset, length))
+            for record in records:
+                tmp.write(record)
+            size = tmp.tell()
+        os.replace(tmp.name, path)
+        return size
+
+    size = await run_in_threadpool(write)
+    catalog_snapshot.refresh()
+    return {"products": len(products), "categories": len(categories), "bytes": size}
+
+class CatalogSnapshot:
+    """Read-only view of the snapshot file, memory-mapped so workers share the page cache.
+
+    Only the small JSON header is parsed per worker; product lookups binary-search the
+    id table in the mapping and decode just the records they return.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file_id = None
+        # (mapping, header, product count, id width, table start, data start), swapped as one
+        self._view: Optional[tuple] = None
+
+    @property
+    def available(self) -> bool:
+        return self._view is not None
+
+    def refresh(self):
+        """Map the file again if the writer has replaced it since the last load."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, header_len, count, id_width = SNAPSHOT_PREAMBLE.unpack_from(mapped)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("not a catalog snapshot")
+            header = json.loads(mapped[SNAPSHOT_PREAMBLE.size:SNAPSHOT_PREAMBLE.size + header_len])
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Ignoring catalog snapshot {self.path}: {e}")
+            return
+        table_start = SNAPSHOT_PREAMBLE.size + header_len
+        data_start = table_start + count * (id_width + SNAPSHOT_ENTRY.size)
+        # The previous mapping is not closed here: a reader in the threadpool may still hold
+        # it, and it is unmapped once the last reference goes away
+        self._view = (mapped, header, count, id_width, table_start, data_start)
+        self._file_id = file_id
+
+    def product(self, product_id: str) -> Optional[dict]:
+        mapped, _, count, id_width, table_start, data_start = self._view
+        key = product_id.encode().ljust(id_width, b"\0")
+        if len(key) > id_width:
+            return None
+        entry_size = id_width + SNAPSHOT_ENTRY.size
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = table_start + mid * entry_size
+            candidate = mapped[position:position + id_width]
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                offset, length = SNAPSHOT_ENTRY.unpack_from(mapped, position + id_width)
+                return json.loads(mapped[data_start + offset:data_start + offset + length])
+        return None
+
+    def products(self, limit: Optional[int] = None) -> Iterator[dict]:
+        """Newest first, walking the length-prefixed records."""
+        mapped, _, count, _, _, position = self._view
+        for _ in range(count if limit is None else min(count, limit)):
+            (length,) = SNAPSHOT_RECORD_LENGTH.unpack_from(mapped, position)
+            position += SNAPSHOT_RECORD_LENGTH.size
+            yield json.loads(mapped[position:position + length])
+            position += length
+
+    def featured(self) -> List[dict]:
+        return [p for p in (self.product(product_id) for product_id in self._view[1]["featured"]) if p]
+
+    def categories(self) -> List[dict]:
+        return list(self._view[1]["categories"])
+
+    def find_products(self, category: Optional[str], search: Optional[str], min_price: Optional[float],
+                      max_price: Optional[float], sort: str, sort_order: int, skip: int, limit: int) -> List[dict]:
+        """Evaluate the storefront product query against the newest SNAPSHOT_SCAN_LIMIT products.
+
+        Search is a case-insensitive substring match rather than a regex, so a client
+        pattern can't stall the worker while the database is already struggling.
+        """
+        needle = search.lower() if search else None
+        matches = []
+        for product in self.products(SNAPSHOT_SCAN_LIMIT):
+            if category and product.get("category") != category:
+                continue
+            if needle and needle not in product.get("name", "").lower() and needle not in product.get("description", "").lower():
+                continue
+            price = product.get("base_price", 0)
+            if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                continue
+            matches.append(product)
+        # Missing values sort first ascending, like MongoDB's null ordering
+        matches.sort(key=lambda p: (p.get(sort) is not None, p.get(sort) or 0), reverse=sort_order < 0)
+        return matches[skip:skip + limit]
+
+    def stats(self) -> dict:
+        if not self.available:
+            return {"available": False, "path": str(self.path)}
+        mapped, header, count, _, _, _ = self._view
+        return {
+            "available": True,
+            "path": str(self.path),
+            "created_at": header["created_at"],
+            "products": count,
+            "categories": len(header["categories"]),
+            "bytes": len(mapped)
+        }
+
+catalog_snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_PATH)
+
+class DatabaseHealth:
+    """Pings MongoDB in the background and decides when catalog reads should degrade."""
+
+    def __init__(self):
+        self.degraded = False
+        self.last_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.fallback_reads = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_degraded(self, reason: str):
+        if not self.degraded:
+            logger.warning(f"Serving catalog from snapshot: {reason}")
+        self.degraded = True
+        self.last_error = reason
+
+    async def check(self):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(raw_db.command("ping"), DB_DEGRADED_LATENCY_MS / 1000 * 4)
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            self.mark_degraded(str(e) or "ping timed out")
+            return
+        self.last_latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        if self.last_latency_ms > DB_DEGRADED_LATENCY_MS:
+            self.mark_degraded(f"ping took {self.last_latency_ms}ms")
+        elif self.degraded:
+            logger.info("MongoDB healthy again; catalog reads back on the database")
+            self.degraded = False
+            self.last_error = None
+
+    async def _loop(self):
+        while True:
+            await self.check()
+            catalog_snapshot.refresh()
+            await asyncio.sleep(DB_HEALTH_INTERVAL)
+
+    async def start(self):
+        if DB_HEALTH_INTERVAL > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "degraded": self.degraded,
+            "last_latency_ms": self.last_latency_ms,
+            "last_error": self.last_error,
+            "fallback_reads": self.fallback_reads
+        }
+
+db_health = DatabaseHealth()
+worker_stats.register("catalog_snapshot", lambda: {"snapshot": catalog_snapshot.stats(), "database": db_health.stats()})
+
+async def catalog_read(fetch: Callable[[], Any], fallback: Callable[[], Any]):
+    """Run a storefront read against MongoDB, or against the snapshot when the database is degraded."""
+    if not db_health.degraded or not catalog_snapshot.available:
+        try:
+            return await asyncio.wait_for(fetch(), DB_DEGRADED_LATENCY_MS / 1000 * 4)
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            if not catalog_snapshot.available:
+                raise HTTPException(status_code=503, detail="Catalog temporarily unavailable")
+            db_health.mark_degraded(str(e) or "catalog read timed out")
+    db_health.fallback_reads += 1
+    # Snapshot scans decode JSON; keep them off the event loop
+    return await run_in_threadpool(fallback)
+
+# The lease is per host because each host keeps its own copy of the file
+periodic_jobs.register(f"catalog_snapshot:{socket.gethostname()}", CATALOG_SNAPSHOT_INTERVAL, write_catalog_snapshot)
+
+# ============ USER DIRECTORY ============
+
+# Lowercased copies of searchable fields, so prefix searches can use an index
+USER_SEARCH_FIELDS = {"email": "email_lc", "name": "name_lc"}
+USER_LIST_FIELDS = ["id", "email", "first_name", "last_name", "is_admin", "created_at"]
+
+def user_search_fields(user: dict) -> dict:
+    return {
+        "email_lc": user["email"].lower(),
+        "name_lc": f"{user['first_name']} {user['last_name']}".lower()
+    }
+
 # ============ AUTH ROUTES ============
 
-@api_router.post("/auth/register")
+@api_router.post("/auth/register", dependencies=[Depends(rate_limit("register"))])
 async def register(user_data: UserCreate):
     # Check if user exists
     existing = await db.users.find_one({"email": user_data.email})
@@ -291,6 +1850,7 @@ async def register(user_data: UserCreate):
     user_doc = user_obj.model_dump()
     user_doc["password"] = user_dict["password"]
     user_doc["created_at"] = user_doc["created_at"].isoformat()
+    user_doc.update(user_search_fields(user_doc))
     
     await db.users.insert_one(user_doc)
     
@@ -299,7 +1859,7 @@ async def register(user_data: UserCreate):
     
     return {"token": token, "user": user_obj}
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limit("login"))])
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
     if not user or not verify_password(credentials.password, user["password"]):
@@ -316,7 +1876,7 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 
 # ============ PRODUCT ROUTES ============
 
-@api_router.get("/products")
+@api_router.get("/products", dependencies=[Depends(rate_limit("product_search", when=lambda request: bool(request.query_params.get("search"))))])
 async def get_products(
     category: Optional[str] = None,
     search: Optional[str] = None,
@@ -342,8 +1902,12 @@ async def get_products(
         else:
             query["base_price"] = {"$lte": max_price}
     
-    sort_order = -1 if sort in ["created_at", "rating"] else 1
-    products = await db.products.find(query, {"_id": 0}).sort(sort, sort_order).skip(skip).limit(limit).to_list(limit)
+    sort_order = -1 if sort in ["created_at", "rating", *COUNTER_SORTS] else 1
+    sort = COUNTER_SORTS.get(sort, sort)
+    products = await catalog_read(
+        lambda: db.products.find(query, {"_id": 0}).sort(sort, sort_order).skip(skip).limit(limit).to_list(limit),
+        lambda: catalog_snapshot.find_products(category, search, min_price, max_price, sort, sort_order, skip, limit)
+    )
     
     for product in products:
         if isinstance(product.get("created_at"), str):
@@ -353,15 +1917,29 @@ async def get_products(
 
 @api_router.get("/products/featured")
 async def get_featured_products():
-    products = await db.products.find({"featured": True}, {"_id": 0}).limit(8).to_list(8)
+    cached = catalog_cache.get("products:featured")
+    if cached is not None:
+        return cached
+    products = await catalog_read(
+        lambda: db.products.find({"featured": True}, {"_id": 0}).limit(8).to_list(8),
+        catalog_snapshot.featured
+    )
     for product in products:
         if isinstance(product.get("created_at"), str):
             product["created_at"] = datetime.fromisoformat(product["created_at"])
+    catalog_cache["products:featured"] = products
     return products
 
+@api_router.get("/products/suggest")
+async def suggest_products(q: str = "", limit: int = 8):
+    return suggest_index.suggest(q, max(1, min(limit, SUGGEST_MAX_RESULTS)))
+
 @api_router.get("/products/{product_id}")
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product = await catalog_read(
+        lambda: db.products.find_one({"id": product_id}, {"_id": 0}),
+        lambda: catalog_snapshot.product(product_id)
+    )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     if isinstance(product.get("created_at"), str):
@@ -374,34 +1952,498 @@ async def create_product(product: ProductCreate):
     doc = product_obj.model_dump()
     doc["created_at"] = doc["created_at"].isoformat()
     await db.products.insert_one(doc)
+    await adjust_category_stats(product_obj.category, 1, product_obj.base_price)
+    await invalidation_bus.publish("products", [product_obj.id])
     return product_obj
 
 @api_router.put("/products/{product_id}", dependencies=[Depends(get_current_admin)])
 async def update_product(product_id: str, product: ProductCreate):
-    doc = product.model_dump()
-    result = await db.products.update_one({"id": product_id}, {"$set": doc})
-    if result.matched_count == 0:
+    # An edit that doesn't send a sku keeps the stored one (the catalog import's key)
+    doc = product.model_dump(exclude={"sku"} if product.sku is None else None)
+    previous = await db.products.find_one_and_update(
+        {"id": product_id}, {"$set": doc}, projection={"_id": 0, "category": 1, "base_price": 1}
+    )
+    if previous is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    if previous.get("category") != product.category:
+        await adjust_category_stats(previous.get("category"), -1)
+        await adjust_category_stats(product.category, 1, product.base_price)
+    elif previous.get("base_price") != product.base_price:
+        await adjust_category_stats(product.category, 0, product.base_price)
+    await invalidation_bus.publish("products", [product_id])
     return {"message": "Product updated"}
 
 @api_router.delete("/products/{product_id}", dependencies=[Depends(get_current_admin)])
 async def delete_product(product_id: str):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    deleted = await db.products.find_one_and_delete({"id": product_id}, projection={"_id": 0, "category": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    await adjust_category_stats(deleted.get("category"), -1)
+    await invalidation_bus.publish("products", [product_id])
     return {"message": "Product deleted"}
 
+@api_router.post("/admin/products:bulk", dependencies=[Depends(get_current_admin)])
+async def bulk_upsert_products(items: List[Dict[str, Any]]):
+    check_bulk_size(items)
+    results = []
+    changed_ids = []
+    for start in range(0, len(items), BULK_CHUNK_SIZE):
+        operations, pending = [], []
+        for index, raw in enumerate(items[start:start + BULK_CHUNK_SIZE], start):
+            try:
+                product = ProductUpsert(**raw)
+            except (ValidationError, TypeError) as e:
+                results.append({"index": index, "ok": False, "error": validation_message(e)})
+                continue
+            fields = product.model_dump(exclude={"id", "sku"} if product.sku is None else {"id"})
+            product_id = product.id or str(uuid.uuid4())
+            operations.append(UpdateOne(
+                {"id": product_id},
+                {
+                    "$set": fields,
+                    "$setOnInsert": {
+                        "id": product_id,
+                        "rating": 0.0,
+                        "review_count": 0,
+                        "created_at": datetime.now(timezone.utc).isoformat()
+                    }
+                },
+                upsert=True
+            ))
+            pending.append((index, product_id, product))
+        if not operations:
+            continue
+        # Categories before the write, so the batch's category counts can be applied as deltas
+        product_ids = [product_id for _, product_id, _ in pending]
+        previous = {doc["id"]: doc.get("category") for doc in await db.products.find(
+            {"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "category": 1}
+        ).to_list(len(product_ids))}
+        upserted, errors = await run_bulk_write(db.products, operations)
+        category_changes = []
+        for op_index, (index, product_id, product) in enumerate(pending):
+            if op_index in errors:
+                results.append({"index": index, "ok": False, "id": product_id, "error": errors[op_index]})
+            else:
+                changed_ids.append(product_id)
+                results.append({"index": index, "ok": True, "id": product_id, "created": op_index in upserted})
+                category_changes.append((previous.get(product_id), product.category, product.base_price))
+                previous[product_id] = product.category
+        await apply_category_stat_changes(category_changes)
+    
+    # One invalidation for the whole batch
+    if changed_ids:
+        await invalidation_bus.publish("products", changed_ids)
+    return bulk_summary(results)
+
+# ============ CATALOG IMPORT ============
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024  # uploads larger than this are spooled to disk
+IMPORT_MAX_ERRORS_KEPT = 100
+IMPORT_FORMATS = ["csv", "ndjson"]
+
+def _parse_csv_row(row: dict) -> dict:
+    # Empty cells fall back to model defaults; nested fields are JSON-encoded cells
+    parsed = {k: v for k, v in row.items() if k and v not in (None, "")}
+    for field in ("images", "variations"):
+        if field in parsed:
+            parsed[field] = json.loads(parsed[field])
+    if "featured" in parsed:
+        parsed["featured"] = parsed["featured"].strip().lower() in ("1", "true", "yes")
+    return parsed
+
+def iter_import_rows(stream: IO[str], fmt: str) -> Iterator[tuple]:
+    """Yield (row_number, row dict or parse error) one row at a time."""
+    if fmt == "ndjson":
+        for row_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as e:
+                yield row_number, e
+    else:
+        for row_number, row in enumerate(csv.DictReader(stream), 1):
+            try:
+                yield row_number, _parse_csv_row(row)
+            except ValueError as e:
+                yield row_number, e
+
+async def _import_batch(batch: List[tuple]) -> tuple:
+    """Validate and upsert one batch by SKU; return (created, updated, errors, product ids)."""
+    errors, operations, pending = [], [], []
+    for row_number, row in batch:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            product = ProductCreate(**row)
+            if not product.sku:
+                raise ValueError("sku is required")
+        except (ValidationError, ValueError, TypeError) as e:
+            errors.append({"row": row_number, "error": validation_message(e)})
+            continue
+        product_id = str(uuid.uuid4())
+        operations.append(UpdateOne(
+            {"sku": product.sku},
+            {
+                "$set": product.model_dump(),
+                "$setOnInsert": {
+                    "id": product_id,
+                    "rating": 0.0,
+                    "review_count": 0,
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                }
+            },
+            upsert=True
+        ))
+        pending.append((row_number, product.sku, product))
+    if not operations:
+        return 0, 0, errors, []
+    batch_skus = [sku for _, sku, _ in pending]
+    previous = {doc["sku"]: doc.get("category") for doc in await db.products.find(
+        {"sku": {"$in": batch_skus}}, {"_id": 0, "sku": 1, "category": 1}
+    ).to_list(len(batch_skus))}
+    upserted, write_errors = await run_bulk_write(db.products, operations)
+    for op_index, message in write_errors.items():
+        errors.append({"row": pending[op_index][0], "error": message})
+    created = len(upserted)
+    updated = len(operations) - len(write_errors) - created
+    category_changes = []
+    for op_index, (_, sku, product) in enumerate(pending):
+        if op_index not in write_errors:
+            category_changes.append((previous.get(sku), product.category, product.base_price))
+            previous[sku] = product.category
+    await apply_category_stat_changes(category_changes)
+    skus = [sku for i, (_, sku, _) in enumerate(pending) if i not in write_errors]
+    docs = await db.products.find({"sku": {"$in": skus}}, {"_id": 0, "id": 1}).to_list(len(skus))
+    return created, updated, errors, [doc["id"] for doc in docs]
+
+async def import_catalog(stream: IO[str], fmt: str, job_id: Optional[str] = None) -> AsyncIterator[dict]:
+    """Stream rows from `stream` into products, yielding a progress report per batch.
+
+    Progress is checkpointed in `import_jobs` after every batch, so an interrupted
+    import resumes from the last committed row when run again with the same job id.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    job = await db.import_jobs.find_one({"id": job_id}, {"_id": 0}) if job_id else None
+    if job is None:
+        job = {
+            "id": job_id or str(uuid.uuid4()),
+            "format": fmt,
+            "status": "running",
+            "rows_done": 0,
+            "created": 0,
+            "updated": 0,
+            "failed": 0,
+            "errors": [],
+            "started_at": now,
+            "updated_at": now
+        }
+        await db.import_jobs.insert_one(dict(job))
+    else:
+        await db.import_jobs.update_one({"id": job["id"]}, {"$set": {"status": "running", "updated_at": now}})
+    resume_after = job["rows_done"]
+    
+    rows = (item for item in iter_import_rows(stream, fmt) if item[0] > resume_after)
+    while True:
+        # Parsing is blocking file I/O, so keep it off the event loop
+        batch = await run_in_threadpool(lambda: list(itertools.islice(rows, IMPORT_BATCH_SIZE)))
+        if not batch:
+            break
+        created, updated, errors, product_ids = await _import_batch(batch)
+        job["rows_done"] = batch[-1][0]
+        job["created"] += created
+        job["updated"] += updated
+        job["failed"] += len(errors)
+        await db.import_jobs.update_one({"id": job["id"]}, {
+            "$set": {"rows_done": job["rows_done"], "updated_at": datetime.now(timezone.utc).isoformat()},
+            "$inc": {"created": created, "updated": updated, "failed": len(errors)},
+            "$push": {"errors": {"$each": errors, "$slice": IMPORT_MAX_ERRORS_KEPT}}
+        })
+        if product_ids:
+            await invalidation_bus.publish("products", product_ids)
+        yield {
+            "job_id": job["id"],
+            "status": "running",
+            "rows_done": job["rows_done"],
+            "created": job["created"],
+            "updated": job["updated"],
+            "failed": job["failed"],
+            "errors": errors
+        }
+    
+    await db.import_jobs.update_one({"id": job["id"]}, {"$set": {"status": "completed", "updated_at": datetime.now(timezone.utc).isoformat()}})
+    yield {
+        "job_id": job["id"],
+        "status": "completed",
+        "rows_done": job["rows_done"],
+        "created": job["created"],
+        "updated": job["updated"],
+        "failed": job["failed"],
+        "errors": []
+    }
+
+@api_router.post("/admin/products/import", dependencies=[Depends(get_current_admin)])
+async def import_products(request: Request, format: str = "csv", job_id: Optional[str] = None):
+    """Import a CSV or NDJSON catalog sent as the raw request body.
+
+    Responds with NDJSON progress lines, one per batch. Re-send the same file with
+    the reported job_id to resume an interrupted import.
+    """
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    
+    async def progress():
+        stream = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+        try:
+            async for report in import_catalog(stream, format, job_id):
+                yield json.dumps(report) + "\n"
+        finally:
+            stream.close()
+    
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+@api_router.get("/admin/products/import/{job_id}", dependencies=[Depends(get_current_admin)])
+async def get_import_job(job_id: str):
+    job = await db.import_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+# ============ RECOMMENDATIONS ============
+
+RELATED_PRODUCTS_INTERVAL = float(os.environ.get('RELATED_PRODUCTS_INTERVAL_SECONDS', 3600))
+RELATED_PRODUCTS_TOP_K = 12
+RELATED_ORDER_CHUNK = 20000
+RELATED_MAX_ITEMS_PER_ORDER = 50  # bounds the pairs generated by one huge order
+# Per-product co-occurrence counts are trimmed to this many partners to bound document size
+RELATED_COUNTS_KEEP = 500
+
+def cooccurrence_pairs(order_products: List[List[int]], n_products: int) -> tuple:
+    """Sparse product x product co-occurrence counts for a chunk of orders.
+
+    Builds the order x product incidence in COO form and expands every order into
+    its ordered product pairs with vectorized index arithmetic, which is A^T A
+    without the diagonal. Returns (left, right, counts) arrays.
+    """
+    sizes = np.fromiter((len(p) for p in order_products), dtype=np.int64, count=len(order_products))
+    if sizes.sum() == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    cols = np.fromiter(itertools.chain.from_iterable(order_products), dtype=np.int64, count=int(sizes.sum()))
+    starts = np.cumsum(sizes) - sizes
+    # Every incidence entry pairs with every entry of its own order
+    entry_sizes = np.repeat(sizes, sizes)
+    entry_starts = np.repeat(starts, sizes)
+    left = np.repeat(cols, entry_sizes)
+    block_offsets = np.repeat(np.cumsum(entry_sizes) - entry_sizes, entry_sizes)
+    within = np.arange(entry_sizes.sum()) - block_offsets
+    right = cols[np.repeat(entry_starts, entry_sizes) + within]
+    off_diagonal = left != right
+    keys, counts = np.unique(left[off_diagonal] * n_products + right[off_diagonal], return_counts=True)
+    return keys // n_products, keys % n_products, counts
+
+async def _apply_cooccurrence(index_to_id: List[str], left, right, counts) -> set:
+    """$inc the pair counts into product_cooccurrence; return the touched product ids."""
+    operations = []
+    touched = set()
+    boundaries = np.flatnonzero(np.diff(left)) + 1
+    for group in np.split(np.arange(len(left)), boundaries):
+        if not len(group):
+            continue
+        product_id = index_to_id[left[group[0]]]
+        increments = {f"counts.{index_to_id[r]}": int(c) for r, c in zip(right[group], counts[group])}
+        operations.append(UpdateOne({"product_id": product_id}, {"$inc": increments}, upsert=True))
+        touched.add(product_id)
+    for start in range(0, len(operations), BULK_CHUNK_SIZE):
+        await raw_db.product_cooccurrence.bulk_write(operations[start:start + BULK_CHUNK_SIZE], ordered=False)
+    return touched
+
+async def _refresh_related(product_ids: List[str]):
+    """Recompute the stored top-K list for each product from its co-occurrence counts."""
+    for start in range(0, len(product_ids), BULK_CHUNK_SIZE):
+        chunk = product_ids[start:start + BULK_CHUNK_SIZE]
+        rows = await raw_db.product_cooccurrence.find({"product_id": {"$in": chunk}}, {"_id": 0}).to_list(len(chunk))
+        top = {}
+        trims = []
+        for row in rows:
+            ranked = sorted(row.get("counts", {}).items(), key=lambda kv: kv[1], reverse=True)
+            top[row["product_id"]] = [pid for pid, _ in ranked[:RELATED_PRODUCTS_TOP_K]]
+            if len(ranked) > RELATED_COUNTS_KEEP:
+                trims.append(UpdateOne(
+                    {"product_id": row["product_id"]},
+                    {"$unset": {f"counts.{pid}": "" for pid, _ in ranked[RELATED_COUNTS_KEEP:]}}
+                ))
+        related_ids = list({pid for ids in top.values() for pid in ids})
+        summaries = {
+            p["id"]: p for p in await raw_db.products.find(
+                {"id": {"$in": related_ids}},
+                {"_id": 0, "id": 1, "name": 1, "base_price": 1, "images": {"$slice": 1}, "rating": 1, "category": 1}
+            ).to_list(len(related_ids))
+        }
+        now = datetime.now(timezone.utc).isoformat()
+        operations = [
+            UpdateOne(
+                {"product_id": product_id},
+                {"$set": {"related": [summaries[pid] for pid in ids if pid in summaries], "updated_at": now}},
+                upsert=True
+            )
+            for product_id, ids in top.items()
+        ]
+        if operations:
+            await raw_db.related_products.bulk_write(operations, ordered=False)
+        if trims:
+            await raw_db.product_cooccurrence.bulk_write(trims, ordered=False)
+
+async def build_related_products(full: bool = False) -> dict:
+    """Fold orders placed since the last run into the co-occurrence counts.
+
+    With `full`, counts are rebuilt from the whole order history instead.
+    """
+    state = await raw_db.job_state.find_one({"_id": "related_products"}) or {}
+    query = {"status": {"$ne": "cancelled"}}
+    if full:
+        await raw_db.product_cooccurrence.delete_many({})
+    elif state.get("watermark"):
+        query["created_at"] = {"$gt": state["watermark"]}
+    
+    watermark = state.get("watermark") if not full else None
+    orders_seen = 0
+    touched = set()
+    cursor = raw_db.orders.find(query, {"_id": 0, "items.product_id": 1, "created_at": 1}).sort("created_at", 1)
+    while True:
+        chunk = await cursor.to_list(RELATED_ORDER_CHUNK)
+        if not chunk:
+            break
+        id_to_index: Dict[str, int] = {}
+        order_products = []
+        for order in chunk:
+            ids = list(dict.fromkeys(item["product_id"] for item in order.get("items", [])))[:RELATED_MAX_ITEMS_PER_ORDER]
+            order_products.append([id_to_index.setdefault(pid, len(id_to_index)) for pid in ids])
+        left, right, counts = cooccurrence_pairs(order_products, max(1, len(id_to_index)))
+        touched |= await _apply_cooccurrence(list(id_to_index), left, right, counts)
+        orders_seen += len(chunk)
+        watermark = chunk[-1]["created_at"]
+    
+    await _refresh_related(sorted(touched))
+    await raw_db.job_state.update_one({"_id": "related_products"}, {"$set": {"watermark": watermark}}, upsert=True)
+    return {"orders": orders_seen, "products_updated": len(touched)}
+
+periodic_jobs.register("related_products", RELATED_PRODUCTS_INTERVAL, build_related_products)
+
+@api_router.get("/products/{product_id}/related")
+async def get_related_products(product_id: str):
+    doc = await db.related_products.find_one({"product_id": product_id}, {"_id": 0, "related": 1})
+    return doc["related"] if doc else []
+
 # ============ CATEGORY ROUTES ============
 
+CATEGORY_RECONCILE_INTERVAL = float(os.environ.get('CATEGORY_RECONCILE_INTERVAL_SECONDS', 3600))
+
+async def adjust_category_stats(name: str, delta: int, price: Optional[float] = None):
+    """Keep a category's denormalized product count and price range in step with a product write."""
+    update: Dict[str, Any] = {"$inc": {"product_count": delta}}
+    if price is not None and delta >= 0:
+        # A range can only widen here; removals are tightened by the reconcile job
+        update["$min"] = {"min_price": price}
+        update["$max"] = {"max_price": price}
+    await db.categories.update_one({"name": name}, update)
+
+async def apply_category_stat_changes(changes: List[tuple]):
+    """Apply a batch of (previous category, category, price) product writes as one update per category.
+
+    `previous` is None for a created product. Like adjust_category_stats, ranges only
+    widen; the reconcile job tightens them.
+    """
+    counts: Dict[str, int] = {}
+    prices: Dict[str, List[float]] = {}
+    for previous, category, price in changes:
+        if previous != category:
+            if previous is not None:
+                counts[previous] = counts.get(previous, 0) - 1
+            counts[category] = counts.get(category, 0) + 1
+        prices.setdefault(category, []).append(price)
+    operations = []
+    for name in counts.keys() | prices.keys():
+        update: Dict[str, Any] = {"$inc": {"product_count": counts.get(name, 0)}}
+        if name in prices:
+            update["$min"] = {"min_price": min(prices[name])}
+            update["$max"] = {"max_price": max(prices[name])}
+        operations.append(UpdateOne({"name": name}, update))
+    if operations:
+        await db.categories.bulk_write(operations, ordered=False)
+
+def _category_stats_pipeline(match: dict) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$category",
+            "product_count": {"$sum": 1},
+            "min_price": {"$min": "$base_price"},
+            "max_price": {"$max": "$base_price"}
+        }}
+    ]
+
+async def reconcile_category_stats() -> dict:
+    """Recount every category from products and fix any drifted denormalized fields."""
+    totals = {
+        row["_id"]: row for row in
+        await raw_db.products.aggregate(_category_stats_pipeline({})).to_list(None)
+    }
+    categories = await raw_db.categories.find(
+        {}, {"_id": 0, "id": 1, "name": 1, "product_count": 1, "min_price": 1, "max_price": 1}
+    ).to_list(None)
+    operations, changed = [], []
+    for category in categories:
+        row = totals.get(category["name"], {})
+        expected = {
+            "product_count": row.get("product_count", 0),
+            "min_price": row.get("min_price"),
+            "max_price": row.get("max_price")
+        }
+        if any(category.get(field) != value for field, value in expected.items()):
+            # Empty ranges are unset rather than stored as null, which $min would treat as lowest
+            empty = {field: "" for field, value in expected.items() if value is None}
+            update = {"$set": {field: value for field, value in expected.items() if value is not None}}
+            if empty:
+                update["$unset"] = empty
+            operations.append(UpdateOne({"id": category["id"]}, update))
+            changed.append(category["id"])
+    if operations:
+        await raw_db.categories.bulk_write(operations, ordered=False)
+        await invalidation_bus.publish("categories", changed)
+    return {"categories": len(categories), "corrected": len(changed)}
+
+periodic_jobs.register("category_stats", CATEGORY_RECONCILE_INTERVAL, reconcile_category_stats)
+# Product writes change the counts shown in the cached category listing
+invalidation_bus.subscribe("products", lambda keys: _invalidate_catalog_cache("categories:"))
+
 @api_router.get("/categories")
 async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).to_list(100)
+    cached = catalog_cache.get("categories:all")
+    if cached is not None:
+        return cached
+    categories = await catalog_read(
+        lambda: db.categories.find({}, {"_id": 0}).to_list(100),
+        catalog_snapshot.categories
+    )
+    catalog_cache["categories:all"] = categories
     return categories
 
 @api_router.post("/categories", dependencies=[Depends(get_current_admin)])
 async def create_category(category: Category):
-    doc = category.model_dump()
+    # Products may already reference this category by name
+    stats = await db.products.aggregate(_category_stats_pipeline({"category": category.name})).to_list(1)
+    category.product_count = stats[0]["product_count"] if stats else 0
+    category.min_price = stats[0]["min_price"] if stats else None
+    category.max_price = stats[0]["max_price"] if stats else None
+    doc = category.model_dump(exclude_none=True)
     await db.categories.insert_one(doc)
+    await invalidation_bus.publish("categories", [category.id])
     return category
 
 # ============ CART ROUTES ============
@@ -517,15 +2559,452 @@ async def clear_cart(session_id: Optional[str] = None, current_user: Optional[di
     await db.carts.update_one(query, {"$set": {"items": [], "updated_at": datetime.now(timezone.utc).isoformat()}})
     return {"message": "Cart cleared"}
 
+# ============ PRICING ============
+
+PRICING_REFRESH_SECONDS = 300  # safety net in case an invalidation is missed
+
+class PricingRules(AppModel):
+    tax_rate: float = 0.1
+    shipping_costs: Dict[str, float] = {"pickup": 0.0, "standard": 10.0, "express": 25.0}
+    default_shipping_cost: float = 25.0  # methods not listed above
+
+class CartQuoteRequest(AppModel):
+    items: List[CartItem]
+    shipping_method: str = "standard"
+    coupon_code: Optional[str] = None
+
+class PricingEngine:
+    """Active coupons and pricing rules held in memory and indexed by coupon code.
+
+    Quotes are computed in one pass over the cart without touching the database.
+    The snapshot is reloaded lazily after a "pricing" invalidation or every
+    PRICING_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self.rules = PricingRules()
+        self.coupons: Dict[str, dict] = {}
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, keys: List[str]):
+        self._stale = True
+
+    async def ensure_loaded(self):
+        if not self._stale and time.monotonic() - self._loaded_at < PRICING_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if not self._stale and time.monotonic() - self._loaded_at < PRICING_REFRESH_SECONDS:
+                return
+            # Clear the flag first so an invalidation arriving mid-load triggers another load
+            self._stale = False
+            rules = await db.pricing_rules.find_one({"_id": "default"}, {"_id": 0})
+            coupons = await db.coupons.find({"is_active": True}, {"_id": 0}).to_list(None)
+            self.rules = PricingRules(**rules) if rules else PricingRules()
+            self.coupons = {coupon["code"].upper(): coupon for coupon in coupons}
+            self._loaded_at = time.monotonic()
+
+    def quote(self, items: List[CartItem], shipping_method: str, coupon_code: Optional[str] = None) -> dict:
+        subtotal = 0.0
+        item_count = 0
+        for item in items:
+            subtotal += item.price * item.quantity
+            item_count += item.quantity
+        
+        discount = 0.0
+        coupon_error = None
+        if coupon_code:
+            coupon = self.coupons.get(coupon_code.upper())
+            expiry = coupon.get("expiry_date") if coupon else None
+            if isinstance(expiry, str):
+                expiry = datetime.fromisoformat(expiry)
+            if expiry is not None and expiry.tzinfo is None:
+                expiry = expiry.replace(tzinfo=timezone.utc)
+            if not coupon:
+                coupon_error = "Invalid coupon code"
+            elif expiry is not None and expiry < datetime.now(timezone.utc):
+                coupon_error = "Coupon has expired"
+            elif subtotal < coupon.get("min_order_value", 0.0):
+                coupon_error = f"Coupon requires a minimum order of {coupon['min_order_value']:.2f}"
+            elif coupon["discount_type"] == "percentage":
+                discount = subtotal * min(coupon["discount_value"], 100.0) / 100
+            else:
+                discount = min(coupon["discount_value"], subtotal)
+        
+        tax = (subtotal - discount) * self.rules.tax_rate
+        shipping_cost = self.rules.shipping_costs.get(shipping_method, self.rules.default_shipping_cost)
+        return {
+            "item_count": item_count,
+            "subtotal": round(subtotal, 2),
+            "discount": round(discount, 2),
+            "coupon_code": coupon_code.upper() if coupon_code and not coupon_error else None,
+            "coupon_error": coupon_error,
+            "tax": round(tax, 2),
+            "shipping_method": shipping_method,
+            "shipping_cost": round(shipping_cost, 2),
+            "total": round(subtotal - discount + tax + shipping_cost, 2)
+        }
+
+pricing_engine = PricingEngine()
+invalidation_bus.subscribe("pricing", pricing_engine.invalidate)
+
+@api_router.post("/cart/quote")
+async def quote_cart(quote_request: CartQuoteRequest):
+    await pricing_engine.ensure_loaded()
+    return pricing_engine.quote(quote_request.items, quote_request.shipping_method, quote_request.coupon_code)
+
+@api_router.get("/admin/coupons", dependencies=[Depends(get_current_admin)])
+async def get_coupons():
+    return await db.coupons.find({}, {"_id": 0}).to_list(1000)
+
+@api_router.post("/admin/coupons", dependencies=[Depends(get_current_admin)])
+async def create_coupon(coupon: Coupon):
+    if coupon.discount_type not in ("percentage", "fixed"):
+        raise HTTPException(status_code=400, detail="discount_type must be percentage or fixed")
+    if coupon.discount_value <= 0:
+        raise HTTPException(status_code=400, detail="discount_value must be positive")
+    if coupon.discount_type == "percentage" and coupon.discount_value > 100:
+        raise HTTPException(status_code=400, detail="A percentage discount cannot exceed 100")
+    coupon.code = coupon.code.upper()
+    try:
+        await db.coupons.insert_one(coupon.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Coupon code already exists")
+    await invalidation_bus.publish("pricing", [coupon.code])
+    return coupon
+
+@api_router.delete("/admin/coupons/{code}", dependencies=[Depends(get_current_admin)])
+async def deactivate_coupon(code: str):
+    result = await db.coupons.update_one({"code": code.upper()}, {"$set": {"is_active": False}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Coupon not found")
+    await invalidation_bus.publish("pricing", [code.upper()])
+    return {"message": "Coupon deactivated"}
+
+@api_router.get("/admin/pricing-rules", dependencies=[Depends(get_current_admin)])
+async def get_pricing_rules():
+    await pricing_engine.ensure_loaded()
+    return pricing_engine.rules
+
+@api_router.put("/admin/pricing-rules", dependencies=[Depends(get_current_admin)])
+async def update_pricing_rules(rules: PricingRules):
+    await db.pricing_rules.update_one({"_id": "default"}, {"$set": rules.model_dump()}, upsert=True)
+    await invalidation_bus.publish("pricing")
+    return rules
+
+# ============ ORDER ARCHIVE ============
+
+ORDER_ARCHIVE_COLLECTION = "orders_archive"
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 180))
+ORDER_ARCHIVE_BATCH = int(os.environ.get('ORDER_ARCHIVE_BATCH', 500))
+ORDER_ARCHIVE_INTERVAL = float(os.environ.get('ORDER_ARCHIVE_INTERVAL_SECONDS', 3600))
+ARCHIVABLE_STATUSES = ["delivered", "cancelled"]
+# Top-level fields left out of archived documents when they hold these defaults
+ARCHIVE_OMITTED_DEFAULTS = {"discount": 0.0, "coupon_code": None, "payment_session_id": None, "shipping_method": "standard"}
+
+def compact_order(order: dict) -> dict:
+    """Archive layout: the order id becomes _id, defaults are omitted and timestamps are BSON dates."""
+    doc = {"_id": order["id"]}
+    for field, value in order.items():
+        if field in ("_id", "id") or (field in ARCHIVE_OMITTED_DEFAULTS and ARCHIVE_OMITTED_DEFAULTS[field] == value):
+            continue
+        if field in ("created_at", "updated_at") and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        doc[field] = value
+    doc["items"] = [{k: v for k, v in item.items() if v is not None} for item in order.get("items", [])]
+    if "shipping_info" in doc and not doc["shipping_info"].get("phone"):
+        doc["shipping_info"] = {k: v for k, v in doc["shipping_info"].items() if k != "phone"}
+    return doc
+
+def expand_order(doc: dict, fields: Optional[List[str]] = None) -> dict:
+    """Return an archived document in the same shape as a hot order.
+
+    With `fields`, the document came from a projected query and only those fields
+    get their omitted defaults back, so it has the same keys as a projected hot order.
+    """
+    defaults = ARCHIVE_OMITTED_DEFAULTS if fields is None else \
+        {field: value for field, value in ARCHIVE_OMITTED_DEFAULTS.items() if field in fields}
+    order = {"id": doc["_id"], **defaults}
+    for field, value in doc.items():
+        if field == "_id":
+            continue
+        if isinstance(value, datetime):
+            # BSON dates come back naive and in UTC
+            value = value.replace(tzinfo=timezone.utc).isoformat()
+        order[field] = value
+    if "items" in order:
+        order["items"] = [{"variation": None, **item} for item in order["items"]]
+    if "shipping_info" in order:
+        order["shipping_info"] = {"phone": "", **order["shipping_info"]}
+    return order
+
+def archive_projection(fields: List[str]) -> dict:
+    return {("_id" if field == "id" else field): 1 for field in fields}
+
+class OrderArchiveHorizon:
+    """Every archived order was created before this ISO timestamp; newer reads skip the archive."""
+
+    def __init__(self):
+        self._value: Optional[str] = None
+        self._loaded = False
+
+    async def get(self) -> Optional[str]:
+        if not self._loaded:
+            state = await raw_db.archive_state.find_one({"_id": "orders"})
+            self._value = state["horizon"] if state else None
+            self._loaded = True
+        return self._value
+
+    def reset(self):
+        self._loaded = False
+
+order_archive_horizon = OrderArchiveHorizon()
+invalidation_bus.subscribe("orders_archive", lambda keys: order_archive_horizon.reset())
+
+async def archive_orders() -> dict:
+    """Move delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS into the archive, in batches."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS)).isoformat()
+    # Raise the horizon before moving anything so readers never miss an order mid-move
+    await raw_db.archive_state.update_one({"_id": "orders"}, {"$max": {"horizon": cutoff}}, upsert=True)
+    await invalidation_bus.publish("orders_archive")
+    state = await raw_db.archive_state.find_one({"_id": "orders"})
+    if "archived_count" not in state:
+        # Running totals start from whatever an earlier version already archived; counted once
+        rows = await raw_db[ORDER_ARCHIVE_COLLECTION].aggregate([{"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "revenue": {"$sum": {"$cond": [{"$eq": ["$payment_status", "paid"]}, "$total", 0]}}
+        }}]).to_list(1)
+        await raw_db.archive_state.update_one({"_id": "orders"}, {"$set": {
+            "archived_count": rows[0]["count"] if rows else 0,
+            "archived_revenue": rows[0]["revenue"] if rows else 0.0
+        }})
+    query = {"status": {"$in": ARCHIVABLE_STATUSES}, "created_at": {"$lt": cutoff}}
+    moved = 0
+    while True:
+        orders = await raw_db.orders.find(query, {"_id": 0}).limit(ORDER_ARCHIVE_BATCH).to_list(ORDER_ARCHIVE_BATCH)
+        if not orders:
+            break
+        # Replace rather than insert so a batch interrupted after this step can be re-run
+        await raw_db[ORDER_ARCHIVE_COLLECTION].bulk_write(
+            [ReplaceOne({"_id": order["id"]}, compact_order(order), upsert=True) for order in orders], ordered=False
+        )
+        order_ids = [order["id"] for order in orders]
+        result = await raw_db.orders.delete_many({"id": {"$in": order_ids}, **query})
+        if result.deleted_count < len(orders):
+            # Orders whose status changed mid-move stay hot; drop their archived copies
+            kept = set(await raw_db.orders.distinct("id", {"id": {"$in": order_ids}}))
+            await raw_db[ORDER_ARCHIVE_COLLECTION].delete_many({"_id": {"$in": list(kept)}})
+            orders = [order for order in orders if order["id"] not in kept]
+        # Analytics reads these instead of scanning the archive
+        revenue = sum(order["total"] for order in orders if order.get("payment_status") == "paid")
+        await raw_db.archive_state.update_one(
+            {"_id": "orders"}, {"$inc": {"archived_count": len(orders), "archived_revenue": revenue}}
+        )
+        moved += len(orders)
+    return {"archived": moved, "horizon": cutoff}
+
+async def archive_totals() -> dict:
+    state = await raw_db.archive_state.find_one({"_id": "orders"}) or {}
+    return {"count": state.get("archived_count", 0), "revenue": state.get("archived_revenue", 0.0)}
+
+periodic_jobs.register("order_archive", ORDER_ARCHIVE_INTERVAL, archive_orders)
+
+def merge_order_pages(hot: List[dict], cold: List[dict], limit: int) -> List[dict]:
+    """Combine hot and archived results in (created_at desc, id asc) order."""
+    merged = sorted(hot + cold, key=lambda order: order["id"])
+    merged.sort(key=lambda order: order["created_at"], reverse=True)
+    return merged[:limit]
+
+def decode_order_cursor(cursor: str) -> tuple:
+    """Return (created_at string, created_at datetime, order id) from an order page cursor."""
+    created_at, order_id = decode_cursor(cursor, 2)
+    if not isinstance(created_at, str) or not isinstance(order_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        return created_at, datetime.fromisoformat(created_at), order_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def find_order_page(query: dict, cursor: Optional[str], limit: int,
+                          fields: Optional[List[str]] = None, include_archive: bool = True) -> dict:
+    """One (created_at desc, id asc) page of orders matching `query` across the hot and archived sets."""
+    hot_query, archive_query = dict(query), dict(query)
+    if cursor:
+        created_at, created_at_date, order_id = decode_order_cursor(cursor)
+        hot_query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$gt": order_id}}
+        ]
+        archive_query["$or"] = [
+            {"created_at": {"$lt": created_at_date}},
+            {"created_at": created_at_date, "_id": {"$gt": order_id}}
+        ]
+    projection = {"_id": 0, **{field: 1 for field in fields or []}}
+    orders = await db.orders.find(hot_query, projection).sort([("created_at", -1), ("id", 1)]).limit(limit + 1).to_list(limit + 1)
+    
+    # Only reach into the archive once the page runs past the archive horizon
+    horizon = await order_archive_horizon.get() if include_archive else None
+    if horizon and (len(orders) <= limit or orders[-1]["created_at"] < horizon):
+        archived = await raw_db[ORDER_ARCHIVE_COLLECTION].find(archive_query, archive_projection(fields) if fields else None) \
+            .sort([("created_at", -1), ("_id", 1)]).limit(limit + 1).to_list(limit + 1)
+        orders = merge_order_pages(orders, [expand_order(doc, fields) for doc in archived], limit + 1)
+    
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor([orders[-1]["created_at"], orders[-1]["id"]])
+    for order in orders:
+        if isinstance(order.get("created_at"), str):
+            order["created_at"] = datetime.fromisoformat(order["created_at"])
+        if isinstance(order.get("updated_at"), str):
+            order["updated_at"] = datetime.fromisoformat(order["updated_at"])
+    return {"orders": orders, "next_cursor": next_cursor}
+
+# ============ ORDER FEED ============
+
+ORDER_FEED_BUFFER = int(os.environ.get('ORDER_FEED_BUFFER', 100))
+ORDER_FEED_MAX_SUBSCRIBERS = int(os.environ.get('ORDER_FEED_MAX_SUBSCRIBERS', 100))
+ORDER_FEED_HEARTBEAT_SECONDS = float(os.environ.get('ORDER_FEED_HEARTBEAT_SECONDS', 15))
+# With a replica set, a change stream on orders can feed the stream instead of the route hooks
+ORDER_FEED_CHANGE_STREAM = os.environ.get('ORDER_FEED_CHANGE_STREAM', '').lower() in ("1", "true", "yes")
+ORDER_FEED_FIELDS = ["id", "order_number", "status", "payment_status", "total", "item_count", "created_at"]
+
+class OrderFeed:
+    """In-process pub/sub of order changes for connected admin dashboards.
+
+    Each subscriber gets a bounded queue. A subscriber that falls behind has its backlog
+    replaced by a single "resync" event, telling the dashboard to refetch analytics,
+    so a slow consumer never holds up publishers or grows memory. Other workers hear about
+    changes through the invalidation bus and relay them to their own subscribers.
+    """
+
+    def __init__(self):
+        self._subscribers: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self.change_stream = False
+
+    @staticmethod
+    def _event(kind: str, order: dict) -> dict:
+        counters = {}
+        if kind == "created":
+            counters["total_orders"] = 1
+        elif kind == "paid":
+            counters["total_revenue"] = order.get("total", 0)
+        return {"kind": kind, "order": {k: v for k, v in order.items() if k in ORDER_FEED_FIELDS}, "counters": counters}
+
+    def subscribe(self) -> asyncio.Queue:
+        if len(self._subscribers) >= ORDER_FEED_MAX_SUBSCRIBERS:
+            raise HTTPException(status_code=503, detail="Too many order stream subscribers")
+        queue = asyncio.Queue(maxsize=ORDER_FEED_BUFFER)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _broadcast(self, event: dict):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"kind": "resync"})
+
+    async def publish(self, kind: str, orders: List[dict]):
+        """Announce changed orders; each dict needs at least "id"."""
+        if self.change_stream or not orders:
+            return
+        for order in orders:
+            self._broadcast(self._event(kind, order))
+        await invalidation_bus.publish("order_feed", [f"{kind}:{order['id']}" for order in orders], apply_locally=False)
+
+    def _on_remote(self, keys: List[str]):
+        # Relayed events carry ids only; look the orders up only if someone is listening
+        if not self._subscribers:
+            return
+        if not keys:
+            # The bus collapses large key lists to "everything"; dashboards must refetch
+            self._broadcast({"kind": "resync"})
+            return
+        asyncio.get_running_loop().create_task(self._relay(keys))
+
+    async def _relay(self, keys: List[str]):
+        changes = [key.split(":", 1) for key in keys]
+        ids = list({order_id for _, order_id in changes})
+        projection = {"_id": 0, **{field: 1 for field in ORDER_FEED_FIELDS}}
+        orders = {doc["id"]: doc for doc in await raw_db.orders.find({"id": {"$in": ids}}, projection).to_list(len(ids))}
+        for kind, order_id in changes:
+            if order_id in orders:
+                self._broadcast(self._event(kind, orders[order_id]))
+
+    async def _watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        try:
+            async with raw_db.orders.watch(pipeline, full_document="updateLookup") as stream:
+                async for change in stream:
+                    order = change.get("fullDocument")
+                    if not order:
+                        continue
+                    updated = change.get("updateDescription", {}).get("updatedFields", {})
+                    if change["operationType"] == "insert":
+                        kind = "created"
+                    elif updated.get("payment_status") == "paid":
+                        kind = "paid"
+                    else:
+                        kind = "status"
+                    self._broadcast(self._event(kind, order))
+        except PyMongoError as e:
+            logger.warning(f"Order change stream unavailable, using route events: {e}")
+        self.change_stream = False
+
+    async def start(self):
+        if ORDER_FEED_CHANGE_STREAM:
+            self.change_stream = True
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+order_feed = OrderFeed()
+invalidation_bus.subscribe("order_feed", order_feed._on_remote)
+
+ORDER_STREAM_TICKET_SECONDS = 60
+ORDER_STREAM_TICKET_SCOPE = "order_stream"
+
+def create_stream_ticket(user_id: str) -> str:
+    # No user_id claim, so get_current_user rejects a ticket used as a bearer token
+    expire = datetime.now(timezone.utc) + timedelta(seconds=ORDER_STREAM_TICKET_SECONDS)
+    return jwt.encode({"sub": user_id, "scope": ORDER_STREAM_TICKET_SCOPE, "exp": expire}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+async def get_stream_admin(ticket: str) -> dict:
+    # EventSource cannot set headers, so the stream takes a short-lived ticket in the query string
+    payload = decode_token(ticket)
+    if payload.get("scope") != ORDER_STREAM_TICKET_SCOPE or not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user = await db.users.find_one({"id": payload["sub"]}, {"_id": 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return await get_current_admin(user)
+
 # ============ ORDER ROUTES ============
 
 @api_router.post("/orders")
-async def create_order(order_data: OrderCreate, current_user: Optional[dict] = Depends(get_current_user)):
+async def create_order(request: Request, order_data: OrderCreate, current_user: Optional[dict] = Depends(get_current_user)):
+    payload = {"user_id": current_user["id"] if current_user else None, "order": order_data}
+    return await idempotency.run(request, "orders", payload, lambda: place_order(order_data, current_user))
+
+async def place_order(order_data: OrderCreate, current_user: Optional[dict]) -> Order:
     # Calculate totals
-    subtotal = sum(item.price * item.quantity for item in order_data.items)
-    tax = subtotal * 0.1  # 10% tax
-    shipping_cost = 0.0 if order_data.shipping_method == "pickup" else (10.0 if order_data.shipping_method == "standard" else 25.0)
-    total = subtotal + tax + shipping_cost
+    await pricing_engine.ensure_loaded()
+    quote = pricing_engine.quote(order_data.items, order_data.shipping_method, order_data.coupon_code)
+    if quote["coupon_error"]:
+        raise HTTPException(status_code=400, detail=quote["coupon_error"])
     
     # Create order items
     order_items = []
@@ -545,34 +3024,36 @@ async def create_order(order_data: OrderCreate, current_user: Optional[dict] = D
         user_id=current_user["id"] if current_user else None,
         items=order_items,
         shipping_info=order_data.shipping_info,
-        subtotal=subtotal,
-        tax=tax,
-        shipping_cost=shipping_cost,
-        total=total,
-        shipping_method=order_data.shipping_method
+        subtotal=quote["subtotal"],
+        discount=quote["discount"],
+        coupon_code=quote["coupon_code"],
+        tax=quote["tax"],
+        shipping_cost=quote["shipping_cost"],
+        total=quote["total"],
+        shipping_method=order_data.shipping_method,
+        item_count=sum(item.quantity for item in order_items)
     )
     
     doc = order_obj.model_dump()
     doc["created_at"] = doc["created_at"].isoformat()
     doc["updated_at"] = doc["updated_at"].isoformat()
     await db.orders.insert_one(doc)
+    await order_feed.publish("created", [doc])
     
     return order_obj
 
 @api_router.get("/orders")
-async def get_orders(current_user: dict = Depends(get_current_user)):
-    query = {"user_id": current_user["id"]}
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    for order in orders:
-        if isinstance(order.get("created_at"), str):
-            order["created_at"] = datetime.fromisoformat(order["created_at"])
-        if isinstance(order.get("updated_at"), str):
-            order["updated_at"] = datetime.fromisoformat(order["updated_at"])
-    return orders
+async def get_orders(cursor: Optional[str] = None, limit: int = 20, current_user: dict = Depends(get_current_user)):
+    # Summary list only; the full document is served by get_order
+    limit = max(1, min(limit, 100))
+    return await find_order_page({"user_id": current_user["id"]}, cursor, limit, ORDER_SUMMARY_FIELDS)
 
 @api_router.get("/orders/{order_id}")
 async def get_order(order_id: str, current_user: dict = Depends(get_current_user)):
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    if not order:
+        archived = await raw_db[ORDER_ARCHIVE_COLLECTION].find_one({"_id": order_id})
+        order = expand_order(archived) if archived else None
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if order["user_id"] != current_user["id"] and not current_user.get("is_admin"):
@@ -584,17 +3065,36 @@ async def get_order(order_id: str, current_user: dict = Depends(get_current_user
     return order
 
 @api_router.get("/admin/orders", dependencies=[Depends(get_current_admin)])
-async def get_all_orders(status: Optional[str] = None, limit: int = 100, skip: int = 0):
-    query = {}
-    if status:
-        query["status"] = status
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    for order in orders:
-        if isinstance(order.get("created_at"), str):
-            order["created_at"] = datetime.fromisoformat(order["created_at"])
-        if isinstance(order.get("updated_at"), str):
-            order["updated_at"] = datetime.fromisoformat(order["updated_at"])
-    return orders
+async def get_all_orders(status: Optional[str] = None, cursor: Optional[str] = None, limit: int = 100):
+    limit = max(1, min(limit, 200))
+    query = {"status": status} if status else {}
+    # Only delivered and cancelled orders are ever archived
+    include_archive = not status or status in ARCHIVABLE_STATUSES
+    return await find_order_page(query, cursor, limit, include_archive=include_archive)
+
+@api_router.post("/admin/orders/stream-ticket")
+async def create_order_stream_ticket(admin: dict = Depends(get_current_admin)):
+    return {"ticket": create_stream_ticket(admin["id"]), "expires_in": ORDER_STREAM_TICKET_SECONDS}
+
+@api_router.get("/admin/orders/stream")
+async def stream_orders(request: Request, admin: dict = Depends(get_stream_admin)):
+    queue = order_feed.subscribe()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), ORDER_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                name = "resync" if event["kind"] == "resync" else "order"
+                yield f"event: {name}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            order_feed.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @api_router.put("/admin/orders/{order_id}/status", dependencies=[Depends(get_current_admin)])
 async def update_order_status(order_id: str, status: str):
@@ -604,8 +3104,45 @@ async def update_order_status(order_id: str, status: str):
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Order not found")
+    await order_feed.publish("status", [{"id": order_id, "status": status}])
     return {"message": "Order status updated"}
 
+@api_router.post("/admin/orders/status:batch", dependencies=[Depends(get_current_admin)])
+async def batch_update_order_status(updates: List[Dict[str, Any]]):
+    check_bulk_size(updates)
+    results, changed = [], []
+    for start in range(0, len(updates), BULK_CHUNK_SIZE):
+        operations, pending = [], []
+        for index, raw in enumerate(updates[start:start + BULK_CHUNK_SIZE], start):
+            try:
+                update = OrderStatusUpdate(**raw)
+            except (ValidationError, TypeError) as e:
+                results.append({"index": index, "ok": False, "error": validation_message(e)})
+                continue
+            if update.status not in ORDER_STATUSES:
+                results.append({"index": index, "ok": False, "order_id": update.order_id, "error": f"Unknown status {update.status}"})
+                continue
+            operations.append(UpdateOne(
+                {"id": update.order_id},
+                {"$set": {"status": update.status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+            ))
+            pending.append((index, update.order_id, update.status))
+        if not operations:
+            continue
+        order_ids = [order_id for _, order_id, _ in pending]
+        existing = {doc["id"] for doc in await db.orders.find({"id": {"$in": order_ids}}, {"_id": 0, "id": 1}).to_list(len(order_ids))}
+        _, errors = await run_bulk_write(db.orders, operations)
+        for op_index, (index, order_id, status) in enumerate(pending):
+            if op_index in errors:
+                results.append({"index": index, "ok": False, "order_id": order_id, "error": errors[op_index]})
+            elif order_id not in existing:
+                results.append({"index": index, "ok": False, "order_id": order_id, "error": "Order not found"})
+            else:
+                results.append({"index": index, "ok": True, "order_id": order_id})
+                changed.append({"id": order_id, "status": status})
+    await order_feed.publish("status", changed)
+    return bulk_summary(results)
+
 # ============ REVIEW ROUTES ============
 
 @api_router.get("/products/{product_id}/reviews")
@@ -635,16 +3172,24 @@ async def create_review(review_data: ReviewCreate, current_user: dict = Depends(
     doc["created_at"] = doc["created_at"].isoformat()
     await db.reviews.insert_one(doc)
     
-    # Update product rating
-    reviews = await db.reviews.find({"product_id": review_data.product_id}, {"_id": 0}).to_list(1000)
-    avg_rating = sum(r["rating"] for r in reviews) / len(reviews)
-    await db.products.update_one(
-        {"id": review_data.product_id},
-        {"$set": {"rating": round(avg_rating, 1), "review_count": len(reviews)}}
-    )
+    # Update product rating after responding
+    await background_tasks.enqueue("product_rating", refresh_product_rating, review_data.product_id)
     
     return review_obj
 
+async def refresh_product_rating(product_id: str):
+    summary = await db.reviews.aggregate([
+        {"$match": {"product_id": product_id}},
+        {"$group": {"_id": None, "rating": {"$avg": "$rating"}, "count": {"$sum": 1}}}
+    ]).to_list(1)
+    if not summary:
+        return
+    await db.products.update_one(
+        {"id": product_id},
+        {"$set": {"rating": round(summary[0]["rating"], 1), "review_count": summary[0]["count"]}}
+    )
+    await invalidation_bus.publish("products", [product_id])
+
 # ============ WISHLIST ROUTES ============
 
 @api_router.get("/wishlist")
@@ -678,10 +3223,86 @@ async def remove_from_wishlist(product_id: str, current_user: dict = Depends(get
         await db.wishlists.update_one({"user_id": current_user["id"]}, {"$set": {"product_ids": product_ids}})
     return {"message": "Removed from wishlist"}
 
+# ============ SALES COUNTERS ============
+
+SALES_ROLL_INTERVAL = float(os.environ.get('SALES_ROLL_INTERVAL_SECONDS', 3600))
+SALES_WINDOWS = {"sales_7d": 7, "sales_30d": 30}
+SALES_DAILY_RETENTION_DAYS = 35
+
+# Sort options backed by maintained counters rather than per-request aggregation
+COUNTER_SORTS = {"bestselling": "units_sold", "trending": "sales_7d"}
+
+async def record_sales(items: List[dict]):
+    """Count a newly paid order's units into the product and daily sales counters."""
+    units: Dict[str, int] = {}
+    for item in items:
+        units[item["product_id"]] = units.get(item["product_id"], 0) + item["quantity"]
+    if not units:
+        return
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    await db.products.bulk_write([
+        UpdateOne({"id": product_id}, {"$inc": {"units_sold": quantity, **{field: quantity for field in SALES_WINDOWS}}})
+        for product_id, quantity in units.items()
+    ], ordered=False)
+    await db.sales_daily.bulk_write([
+        UpdateOne({"product_id": product_id, "day": today}, {"$inc": {"units": quantity}}, upsert=True)
+        for product_id, quantity in units.items()
+    ], ordered=False)
+
+async def roll_sales_windows() -> dict:
+    """Recompute the windowed counters from daily buckets so old sales age out."""
+    now = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    group = {"_id": "$product_id"}
+    for field, days in SALES_WINDOWS.items():
+        cutoff = now - timedelta(days=days - 1)
+        group[field] = {"$sum": {"$cond": [{"$gte": ["$day", cutoff]}, "$units", 0]}}
+    oldest = now - timedelta(days=max(SALES_WINDOWS.values()) - 1)
+    totals = await raw_db.sales_daily.aggregate([
+        {"$match": {"day": {"$gte": oldest}}},
+        {"$group": group}
+    ]).to_list(None)
+    
+    operations = [
+        UpdateOne({"id": row["_id"]}, {"$set": {field: row[field] for field in SALES_WINDOWS}})
+        for row in totals
+    ]
+    for start in range(0, len(operations), BULK_CHUNK_SIZE):
+        await raw_db.products.bulk_write(operations[start:start + BULK_CHUNK_SIZE], ordered=False)
+    # Products with no sales left in any window
+    reset = await raw_db.products.update_many(
+        {"id": {"$nin": [row["_id"] for row in totals]}, "$or": [{field: {"$gt": 0}} for field in SALES_WINDOWS]},
+        {"$set": {field: 0 for field in SALES_WINDOWS}}
+    )
+    return {"products_rolled": len(operations), "products_reset": reset.modified_count}
+
+periodic_jobs.register("sales_windows", SALES_ROLL_INTERVAL, roll_sales_windows)
+
 # ============ PAYMENT ROUTES ============
 
+async def mark_order_paid(session_id: str):
+    # The conditional update lets exactly one caller (status poll or webhook) win the transition
+    transaction = await db.payment_transactions.find_one_and_update(
+        {"session_id": session_id, "payment_status": {"$ne": "paid"}},
+        {"$set": {"payment_status": "paid", "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0}
+    )
+    if not transaction:
+        return
+    order = await db.orders.find_one_and_update(
+        {"payment_session_id": session_id},
+        {"$set": {"payment_status": "paid", "status": "processing", "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "id": 1, "total": 1, "items.product_id": 1, "items.quantity": 1}
+    )
+    if order:
+        # $inc is not idempotent, so a failed attempt must not be repeated
+        await background_tasks.enqueue("sales_counters", record_sales, order["items"], attempts=1)
+        await order_feed.publish("paid", [{"id": order["id"], "total": order["total"], "payment_status": "paid", "status": "processing"}])
+
 @api_router.post("/payments/create-checkout")
 async def create_checkout_session(request: Request, order_id: str):
+    return await idempotency.run(request, "checkout", {"order_id": order_id}, lambda: start_checkout(request, order_id))
+
+async def start_checkout(request: Request, order_id: str) -> dict:
     # Get order
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
@@ -703,7 +3324,8 @@ async def create_checkout_session(request: Request, order_id: str):
     
     session = await stripe_checkout.create_checkout_session(checkout_request)
     
-    # Create payment transaction
+    # Create payment transaction; inline, because mark_order_paid needs it as soon as
+    # the customer can reach Stripe
     transaction = PaymentTransaction(
         order_id=order_id,
         session_id=session.session_id,
@@ -728,16 +3350,7 @@ async def get_payment_status(session_id: str):
     
     # Update transaction and order if paid
     if status.payment_status == "paid":
-        transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
-        if transaction and transaction["payment_status"] != "paid":
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": {"payment_status": "paid", "updated_at": datetime.now(timezone.utc).isoformat()}}
-            )
-            await db.orders.update_one(
-                {"payment_session_id": session_id},
-                {"$set": {"payment_status": "paid", "status": "processing", "updated_at": datetime.now(timezone.utc).isoformat()}}
-            )
+        await mark_order_paid(session_id)
     
     return status
 
@@ -751,31 +3364,85 @@ async def stripe_webhook(request: Request):
         event = await stripe_checkout.handle_webhook(body, signature)
         
         if event.payment_status == "paid":
-            transaction = await db.payment_transactions.find_one({"session_id": event.session_id}, {"_id": 0})
-            if transaction and transaction["payment_status"] != "paid":
-                await db.payment_transactions.update_one(
-                    {"session_id": event.session_id},
-                    {"$set": {"payment_status": "paid", "updated_at": datetime.now(timezone.utc).isoformat()}}
-                )
-                await db.orders.update_one(
-                    {"payment_session_id": event.session_id},
-                    {"$set": {"payment_status": "paid", "status": "processing", "updated_at": datetime.now(timezone.utc).isoformat()}}
-                )
+            await mark_order_paid(event.session_id)
         
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# ============ HEALTH ROUTES ============
+
+WARMUP_RETRY_SECONDS = float(os.environ.get('WARMUP_RETRY_SECONDS', 2))
+
+async def prime_caches():
+    await pricing_engine.ensure_loaded()
+    await get_featured_products()
+    await get_categories()
+
+async def start_services():
+    await query_profiler.start()
+    await invalidation_bus.start()
+    await background_tasks.start()
+    await periodic_jobs.start()
+    await db_health.start()
+    await order_feed.start()
+    await worker_stats.start()
+
+async def stop_services(drain_seconds: float):
+    # Safe to call when some or none of the services were started
+    await worker_stats.stop()
+    await background_tasks.drain(drain_seconds)
+    await periodic_jobs.stop()
+    await db_health.stop()
+    await order_feed.stop()
+    await invalidation_bus.stop()
+
+async def warm_up():
+    """Open the connection pool, check indexes and prime caches, then mark the worker ready."""
+    while True:
+        try:
+            await startup_profile.step("mongo_ping", lambda: raw_db.command("ping"))
+            await startup_profile.step("indexes", ensure_indexes)
+            await startup_profile.step("suggest_index", suggest_index.rebuild)
+            await startup_profile.step("cache_priming", prime_caches)
+            # The first bcrypt hash loads the backend; pay for it before the first login does
+            await startup_profile.step("password_hashing", lambda: run_in_threadpool(get_pwd_context().hash, "warm-up"))
+            await startup_profile.step("services", start_services)
+            break
+        except Exception as e:
+            # Anything short of success retries; a dead warm-up task would leave the worker gated forever
+            startup_profile.last_error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Warm-up failed, retrying: {startup_profile.last_error}")
+            # Catalog reads let through the readiness gate go straight to the snapshot meanwhile
+            db_health.mark_degraded(startup_profile.last_error)
+            await stop_services(0)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    startup_profile.finish()
+    logger.info(f"Worker ready: {startup_profile.report()}")
+
+@api_router.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    report = startup_profile.report()
+    if not report["ready"]:
+        return JSONResponse(status_code=503, content=report)
+    return report
+
 # ============ ADMIN ROUTES ============
 
 @api_router.get("/admin/analytics", dependencies=[Depends(get_current_admin)])
 async def get_analytics():
-    # Get total orders
-    total_orders = await db.orders.count_documents({})
+    # Get total orders, hot and archived; the archive's totals are kept by archive_orders
+    archived = await archive_totals()
+    total_orders = await db.orders.count_documents({}) + archived["count"]
     
     # Get total revenue
-    orders = await db.orders.find({"payment_status": "paid"}, {"_id": 0, "total": 1}).to_list(10000)
-    total_revenue = sum(order["total"] for order in orders)
+    revenue_pipeline = [{"$match": {"payment_status": "paid"}}, {"$group": {"_id": None, "total": {"$sum": "$total"}}}]
+    rows = await db.orders.aggregate(revenue_pipeline).to_list(1)
+    total_revenue = (rows[0]["total"] if rows else 0) + archived["revenue"]
     
     # Get total products
     total_products = await db.products.count_documents({})
@@ -796,28 +3463,104 @@ async def get_analytics():
         "total_revenue": total_revenue,
         "total_products": total_products,
         "total_users": total_users,
+        "archived_orders": archived["count"],
+        "archive_horizon": await order_archive_horizon.get(),
         "recent_orders": recent_orders
     }
 
 @api_router.get("/admin/users", dependencies=[Depends(get_current_admin)])
-async def get_all_users():
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
+async def get_all_users(q: Optional[str] = None, field: str = "email", cursor: Optional[str] = None, limit: int = 50):
+    # Newest first by default; a search pages through the matching prefix in index order
+    limit = max(1, min(limit, 200))
+    if field not in USER_SEARCH_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(USER_SEARCH_FIELDS)}")
+    sort_field = USER_SEARCH_FIELDS[field] if q else "created_at"
+    direction = 1 if q else -1
+    conditions = []
+    if q:
+        # Anchored, case-sensitive regex on the lowercased field becomes an index range scan
+        conditions.append({sort_field: {"$regex": f"^{re.escape(q.strip().lower())}"}})
+    if cursor:
+        value, user_id = decode_cursor(cursor, 2)
+        conditions.append({"$or": [
+            {sort_field: {"$gt" if q else "$lt": value}},
+            {sort_field: value, "id": {"$gt": user_id}}
+        ]})
+    query = {"$and": conditions} if conditions else {}
+    projection = {"_id": 0, sort_field: 1, **{f: 1 for f in USER_LIST_FIELDS}}
+    users = await db.users.find(query, projection).sort([(sort_field, direction), ("id", 1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor([users[-1][sort_field], users[-1]["id"]])
     for user in users:
+        if sort_field != "created_at":
+            user.pop(sort_field)
         if isinstance(user.get("created_at"), str):
             user["created_at"] = datetime.fromisoformat(user["created_at"])
-    return users
+    # From collection metadata; an exact count would scan the whole index
+    total_estimate = await db.users.estimated_document_count()
+    return {"users": users, "next_cursor": next_cursor, "total_estimate": total_estimate}
+
+@api_router.get("/admin/query-stats", dependencies=[Depends(get_current_admin)])
+async def get_query_stats(limit: int = 20, include_plans: bool = False):
+    # Merge every worker's top shapes; each publishes at most PROFILER_PUBLISH_SHAPES
+    workers = await worker_stats.collect("queries")
+    merged: Dict[str, dict] = {}
+    for worker in workers:
+        for stats in (worker["stats"] or {}).get("shapes", []):
+            total = merged.get(stats["shape"])
+            if total is None:
+                merged[stats["shape"]] = {k: v for k, v in stats.items() if k != "avg_ms"}
+                continue
+            total["count"] += stats["count"]
+            total["total_ms"] += stats["total_ms"]
+            total["slow_count"] += stats["slow_count"]
+            total["max_ms"] = max(total["max_ms"], stats["max_ms"])
+    shapes = sorted(merged.values(), key=lambda s: s["total_ms"], reverse=True)[:max(1, min(limit, 200))]
+    for shape in shapes:
+        shape["total_ms"] = round(shape["total_ms"], 2)
+        shape["avg_ms"] = round(shape["total_ms"] / shape["count"], 2)
+    if include_plans and shapes:
+        # Latest sampled plan per shape; the capped collection keeps insertion order
+        plans = {}
+        async for plan in raw_db[QUERY_PLAN_COLLECTION].find(
+            {"shape": {"$in": [s["shape"] for s in shapes]}}, {"_id": 0}
+        ).sort("$natural", -1):
+            plans.setdefault(plan["shape"], plan)
+        for shape in shapes:
+            shape["plan"] = plans.get(shape["shape"])
+    return {
+        "slow_query_ms": SLOW_QUERY_MS,
+        "workers": len(workers),
+        "tracked_shapes": sum((w["stats"] or {}).get("tracked_shapes", 0) for w in workers),
+        "dropped_shapes": sum((w["stats"] or {}).get("dropped_shapes", 0) for w in workers),
+        "shapes": shapes
+    }
 
-# Add CORS middleware first
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/admin/jobs", dependencies=[Depends(get_current_admin)])
+async def get_job_stats():
+    return periodic_jobs.stats
+
+@api_router.get("/admin/suggest-stats", dependencies=[Depends(get_current_admin)])
+async def get_suggest_stats():
+    return {"workers": await worker_stats.collect("suggest")}
+
+@api_router.get("/admin/tasks", dependencies=[Depends(get_current_admin)])
+async def get_task_stats():
+    return {"workers": await worker_stats.collect("tasks")}
+
+@api_router.get("/admin/limits", dependencies=[Depends(get_current_admin)])
+async def get_limit_stats():
+    return {"workers": await worker_stats.collect("limits")}
+
+@api_router.get("/admin/catalog-snapshot", dependencies=[Depends(get_current_admin)])
+async def get_catalog_snapshot_stats():
+    return {"workers": await worker_stats.collect("catalog_snapshot")}
 
 # Include the router
-app.include_router(api_router)
+app.include_router(api_router, dependencies=[Depends(track_route)])
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -826,15 +3569,73 @@ async def log_requests(request: Request, call_next):
     logger.info(f"Response status: {response.status_code}")
     return response
 
+# Storefront reads that catalog_read can answer from the snapshot while MongoDB is unreachable
+SNAPSHOT_READ_ENDPOINTS = {get_products, get_featured_products, get_product, get_categories}
+
+def served_from_snapshot(request: Request) -> bool:
+    if request.method != "GET" or not catalog_snapshot.available:
+        return False
+    for route in app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "endpoint", None) in SNAPSHOT_READ_ENDPOINTS
+    return False
+
+@app.middleware("http")
+async def readiness_gate(request: Request, call_next):
+    # Until warm-up finishes only the health probes and snapshot-backed catalog reads are served
+    if (not startup_profile.ready and not request.url.path.startswith("/api/health")
+            and not served_from_snapshot(request)):
+        return JSONResponse(status_code=503, content={"detail": "Server warming up"}, headers={"Retry-After": "1"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    # Registered after the other request middlewares so it runs before them and sheds load early
+    if request.method == "OPTIONS":
+        return await call_next(request)
+    if not admission.try_enter():
+        return JSONResponse(status_code=503, content={"detail": "Server busy"}, headers={"Retry-After": "1"})
+    try:
+        return await call_next(request)
+    finally:
+        admission.leave()
+
+# Added last so CORS is the outermost layer and also decorates the 503s above
+app.add_middleware(
+    CORSMiddleware,
+    allow_credentials=True,
+    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+startup_profile.mark("routes")
+
+def default_worker_count() -> int:
+    # Respect CPU affinity / container limits where the platform exposes them
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=5000)  # no reload
+    # WEB_CONCURRENCY=auto runs one worker per available core; in-process caches stay
+    # coherent across workers through the invalidation bus
+    concurrency = os.environ.get('WEB_CONCURRENCY', '1')
+    workers = default_worker_count() if concurrency == "auto" else max(1, int(concurrency))
+    host = os.environ.get('HOST', "127.0.0.1")
+    port = int(os.environ.get('PORT', 5000))
+    if workers > 1:
+        uvicorn.run("server:app", app_dir=str(ROOT_DIR), host=host, port=port, workers=workers)
+    else:
+        uvicorn.run(app, host=host, port=port)  # no reload
 
 # @app.on_event("shutdown")
 # async def shutdown_db_client():
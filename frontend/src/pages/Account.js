@@ -10,6 +10,7 @@ export default function Account() {
   const navigate = useNavigate();
   const { user, token, logout } = useAuth();
   const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [wishlist, setWishlist] = useState([]);
   const [activeTab, setActiveTab] = useState('orders');
   const [loading, setLoading] = useState(true);
@@ -29,7 +30,8 @@ export default function Account() {
         axios.get(`${API}/orders`, config),
         axios.get(`${API}/wishlist`, config)
       ]);
-      setOrders(ordersRes.data);
+      setOrders(ordersRes.data.orders);
+      setNextCursor(ordersRes.data.next_cursor);
       setWishlist(wishlistRes.data.product_ids || []);
     } catch (error) {
       console.error('Failed to fetch data:', error);
@@ -38,6 +40,17 @@ export default function Account() {
     }
   };
 
+  const loadMoreOrders = async () => {
+    try {
+      const config = { headers: { Authorization: `Bearer ${token}` }, params: { cursor: nextCursor } };
+      const response = await axios.get(`${API}/orders`, config);
+      setOrders((prev) => [...prev, ...response.data.orders]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Failed to fetch orders:', error);
+    }
+  };
+
   if (!user) return null;
 
   return (
@@ -111,14 +124,9 @@ export default function Account() {
                             </p>
                           </div>
                         </div>
-                        <div className="space-y-2">
-                          {order.items.map((item, idx) => (
-                            <div key={idx} className="flex justify-between text-sm" data-testid={`order-item-${order.id}-${idx}`}>
-                              <span data-testid={`order-item-name-${order.id}-${idx}`}>{item.product_name} x {item.quantity}</span>
-                              <span data-testid={`order-item-price-${order.id}-${idx}`}>${(item.price * item.quantity).toFixed(2)}</span>
-                            </div>
-                          ))}
-                        </div>
+                        <p className="text-sm" data-testid={`order-item-count-${order.id}`}>
+                          {order.item_count} {order.item_count === 1 ? 'item' : 'items'}
+                        </p>
                         <div className="mt-4 pt-4 border-t border-border">
                           <span className="inline-block px-3 py-1 bg-secondary text-xs uppercase tracking-wider" data-testid={`order-status-${order.id}`}>
                             {order.status}
@@ -126,6 +134,15 @@ export default function Account() {
                         </div>
                       </div>
                     ))}
+                    {nextCursor && (
+                      <button
+                        onClick={loadMoreOrders}
+                        className="w-full px-4 py-3 text-sm uppercase tracking-wider border-2 border-border hover:bg-secondary transition-colors"
+                        data-testid="load-more-orders-button"
+                      >
+                        Load more
+                      </button>
+                    )}
                   </div>
                 )}
               </div>
@@ -6,6 +6,23 @@ import { DollarSign, Package, ShoppingBag, Users } from 'lucide-react';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
+// Apply one live order event to the dashboard state
+const applyOrderEvent = (analytics, { order, counters }) => {
+  const known = analytics.recent_orders.some((o) => o.id === order.id);
+  let recentOrders = analytics.recent_orders;
+  if (known) {
+    recentOrders = recentOrders.map((o) => (o.id === order.id ? { ...o, ...order } : o));
+  } else if (order.order_number) {
+    recentOrders = [order, ...recentOrders].slice(0, 10);
+  }
+  return {
+    ...analytics,
+    total_orders: analytics.total_orders + (counters.total_orders || 0),
+    total_revenue: analytics.total_revenue + (counters.total_revenue || 0),
+    recent_orders: recentOrders,
+  };
+};
+
 export default function AdminDashboard() {
   const navigate = useNavigate();
   const { user, token } = useAuth();
@@ -20,6 +37,45 @@ export default function AdminDashboard() {
     fetchAnalytics();
   }, [user, navigate]);
 
+  // Live updates instead of polling; a resync means events were dropped
+  useEffect(() => {
+    if (!user || !user.is_admin || !token) return;
+    // The stream URL carries a short-lived ticket rather than the login token
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+
+    const connect = async (resync) => {
+      try {
+        const config = { headers: { Authorization: `Bearer ${token}` } };
+        const response = await axios.post(`${API}/admin/orders/stream-ticket`, {}, config);
+        if (closed) return;
+        source = new EventSource(`${API}/admin/orders/stream?ticket=${encodeURIComponent(response.data.ticket)}`);
+        source.addEventListener('order', (event) => {
+          const data = JSON.parse(event.data);
+          setAnalytics((prev) => (prev ? applyOrderEvent(prev, data) : prev));
+        });
+        source.addEventListener('resync', () => fetchAnalytics());
+        source.onerror = () => {
+          // The browser retries on its own until the server rejects the expired ticket
+          if (source.readyState === EventSource.CLOSED && !closed) {
+            retryTimer = setTimeout(() => connect(true), 3000);
+          }
+        };
+        if (resync) fetchAnalytics();
+      } catch (error) {
+        if (!closed) retryTimer = setTimeout(() => connect(true), 3000);
+      }
+    };
+
+    connect(false);
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, [user, token]);
+
   const fetchAnalytics = async () => {
     try {
       const config = { headers: { Authorization: `Bearer ${token}` } };
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# server.py lives in backend/ and loads its settings from backend/.env on import
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Point every database handle in server.py at a fresh in-memory database."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "raw_db", database)
+    monkeypatch.setattr(server, "db", server.ProfiledDatabase(database))
+    for holder in (server.query_profiler, server.invalidation_bus, server.idempotency, server.worker_stats):
+        monkeypatch.setattr(holder, "_db", database)
+    server.order_archive_horizon.reset()
+    return database
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    """A catalog snapshot mapped from a temporary file in place of the host's copy."""
+    view = server.CatalogSnapshot(tmp_path / "catalog_snapshot.bin")
+    monkeypatch.setattr(server, "catalog_snapshot", view)
+    return view
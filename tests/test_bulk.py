@@ -0,0 +1,62 @@
+import pytest
+
+import server
+from server import batch_update_order_status, bulk_upsert_products
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    published = []
+
+    async def publish(kind, orders):
+        published.append((kind, orders))
+
+    monkeypatch.setattr(server.order_feed, "publish", publish)
+    return published
+
+
+async def test_batch_status_reports_each_item(mongo, feed):
+    await mongo.orders.insert_many([{"id": "o1", "status": "pending"}, {"id": "o2", "status": "pending"}])
+    summary = await batch_update_order_status([
+        {"order_id": ["x"], "status": "shipped"},
+        {"order_id": "o1", "status": "shipped"},
+        {"order_id": "o2", "status": "lost"},
+        {"order_id": "missing", "status": "shipped"},
+        {"status": "shipped"},
+    ])
+    assert summary["succeeded"] == 1 and summary["failed"] == 4
+    assert [r["ok"] for r in summary["results"]] == [False, True, False, False, False]
+    assert summary["results"][2]["error"] == "Unknown status lost"
+    assert summary["results"][3]["error"] == "Order not found"
+    assert (await mongo.orders.find_one({"id": "o1"}))["status"] == "shipped"
+    assert (await mongo.orders.find_one({"id": "o2"}))["status"] == "pending"
+    assert feed == [("status", [{"id": "o1", "status": "shipped"}])]
+
+
+async def test_bulk_upsert_reports_each_item(mongo):
+    await mongo.products.insert_one({"id": "p1", "name": "Old", "sku": "SKU1", "base_price": 1.0, "category": "A"})
+    summary = await bulk_upsert_products([
+        {"id": "p1", "name": "Renamed", "description": "d", "base_price": 2.0, "category": "A"},
+        {"id": "p3", "name": "No price"},
+        {"id": "p2", "name": "New", "description": "d", "base_price": 3.0, "category": "B"},
+    ])
+    assert [(r["index"], r["ok"]) for r in summary["results"]] == [(0, True), (1, False), (2, True)]
+    p1 = await mongo.products.find_one({"id": "p1"})
+    assert p1["name"] == "Renamed" and p1["sku"] == "SKU1"
+    assert (await mongo.products.find_one({"id": "p2"}))["review_count"] == 0
+
+
+async def test_bulk_upsert_flags_created_products(mongo):
+    await mongo.products.insert_one({"id": "p1", "name": "Old", "base_price": 1.0, "category": "A"})
+    item = {"name": "P", "description": "d", "base_price": 2.0, "category": "A"}
+    assert (await bulk_upsert_products([{"id": "p1", **item}]))["results"][0]["created"] is False
+    assert (await bulk_upsert_products([{"id": "p2", **item}]))["results"][0]["created"] is True
+
+
+async def test_bulk_size_is_capped(mongo, monkeypatch):
+    monkeypatch.setattr(server, "BULK_MAX_ITEMS", 2)
+    with pytest.raises(server.HTTPException) as excinfo:
+        await bulk_upsert_products([{}] * 3)
+    assert excinfo.value.status_code == 413
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+import server
+from server import SNAPSHOT_PREAMBLE, write_catalog_snapshot
+
+pytestmark = pytest.mark.anyio
+
+# Variable widths, shared prefixes and non-ASCII ids exercise the padded id table
+PRODUCT_IDS = ["a", "ab", "abc", "b", "0", "zz-9", "ünï", "a" * 40, "m"]
+
+
+def product(index, product_id, **fields):
+    return {"id": product_id, "name": f"Product {index}", "description": f"about {product_id}",
+            "base_price": float(index), "category": "Even" if index % 2 == 0 else "Odd",
+            "featured": index < 2, "created_at": f"2025-01-{index + 1:02d}T00:00:00+00:00", **fields}
+
+
+@pytest.fixture
+async def written(mongo, snapshot):
+    await mongo.products.insert_many([product(i, product_id) for i, product_id in enumerate(PRODUCT_IDS)])
+    await mongo.categories.insert_many([{"id": "c1", "name": "Even", "slug": "even"}, {"id": "c2", "name": "Odd", "slug": "odd"}])
+    result = await write_catalog_snapshot(snapshot.path)
+    return snapshot, result
+
+
+async def test_every_id_is_found_by_binary_search(written):
+    snapshot, result = written
+    assert result["products"] == len(PRODUCT_IDS)
+    assert snapshot.available
+    for i, product_id in enumerate(PRODUCT_IDS):
+        assert snapshot.product(product_id) == product(i, product_id)
+
+
+@pytest.mark.parametrize("missing", ["", "aa", "abcd", "a" * 41, "a" * 39, "c", "zzz", "\0"])
+async def test_missing_ids(written, missing):
+    snapshot, _ = written
+    assert snapshot.product(missing) is None
+
+
+async def test_products_walk_newest_first(written):
+    snapshot, _ = written
+    newest_first = list(reversed(PRODUCT_IDS))
+    assert [p["id"] for p in snapshot.products()] == newest_first
+    assert [p["id"] for p in snapshot.products(3)] == newest_first[:3]
+
+
+async def test_header_serves_featured_and_categories(written):
+    snapshot, _ = written
+    assert {p["id"] for p in snapshot.featured()} == {"a", "ab"}
+    assert [c["name"] for c in snapshot.categories()] == ["Even", "Odd"]
+    assert snapshot.stats()["products"] == len(PRODUCT_IDS)
+
+
+async def test_find_products_matches_the_storefront_query(written):
+    snapshot, _ = written
+    found = snapshot.find_products("Odd", None, 2.0, 6.0, "base_price", 1, 0, 10)
+    assert [p["base_price"] for p in found] == [3.0, 5.0]
+    found = snapshot.find_products(None, "ABOUT ZZ", None, None, "created_at", -1, 0, 10)
+    assert [p["id"] for p in found] == ["zz-9"]
+    found = snapshot.find_products(None, None, None, None, "base_price", -1, 2, 3)
+    assert [p["base_price"] for p in found] == [6.0, 5.0, 4.0]
+
+
+async def test_refresh_maps_a_replaced_file(written, mongo):
+    snapshot, _ = written
+    await mongo.products.insert_one(product(20, "new"))
+    await write_catalog_snapshot(snapshot.path)
+    assert snapshot.product("new")["name"] == "Product 20"
+    assert snapshot.stats()["products"] == len(PRODUCT_IDS) + 1
+
+
+async def test_empty_catalog(mongo, snapshot):
+    await write_catalog_snapshot(snapshot.path)
+    assert snapshot.available
+    assert snapshot.product("a") is None
+    assert list(snapshot.products()) == []
+
+
+async def test_foreign_file_is_ignored(snapshot):
+    snapshot.path.write_bytes(SNAPSHOT_PREAMBLE.pack(b"NOTASNAP", 0, 0, 0))
+    snapshot.refresh()
+    assert not snapshot.available
+    os.remove(snapshot.path)
+    snapshot.refresh()
+    assert not snapshot.available
@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+import server
+from server import apply_category_stat_changes, bulk_upsert_products, import_catalog, reconcile_category_stats
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def quiet_bus(monkeypatch):
+    async def publish(topic, keys=None, apply_locally=True):
+        pass
+
+    monkeypatch.setattr(server.invalidation_bus, "publish", publish)
+
+
+@pytest.fixture
+async def categories(mongo):
+    await mongo.categories.insert_many([
+        {"id": "c1", "name": "Home", "slug": "home", "product_count": 1, "min_price": 10.0, "max_price": 10.0},
+        {"id": "c2", "name": "Garden", "slug": "garden", "product_count": 0},
+    ])
+    await mongo.products.insert_one({"id": "p1", "sku": "S1", "name": "Lamp", "description": "d",
+                                     "base_price": 10.0, "category": "Home"})
+    return mongo.categories
+
+
+async def stats(collection):
+    return {c["name"]: (c["product_count"], c.get("min_price"), c.get("max_price"))
+            for c in await collection.find({}).to_list(None)}
+
+
+async def test_changes_fold_into_one_update_per_category(categories):
+    await apply_category_stat_changes([(None, "Home", 4.0), (None, "Home", 30.0), ("Home", "Garden", 7.0)])
+    assert await stats(categories) == {"Home": (2, 4.0, 30.0), "Garden": (1, 7.0, 7.0)}
+
+
+async def test_bulk_upsert_applies_deltas_without_a_recount(categories, monkeypatch):
+    async def no_recount():
+        raise AssertionError("bulk writes must not recount every category")
+
+    monkeypatch.setattr(server, "reconcile_category_stats", no_recount)
+    item = {"description": "d", "base_price": 25.0}
+    summary = await bulk_upsert_products([
+        {"id": "p1", "name": "Lamp", "category": "Garden", **item},
+        {"id": "p2", "name": "Rake", "category": "Garden", "base_price": 5.0, "description": "d"},
+        {"id": "p3", "name": "Rug", "category": "Home", **item},
+        {"id": "p4", "name": "Broken"},
+    ])
+    assert summary["succeeded"] == 3
+    assert await stats(categories) == {"Home": (1, 10.0, 25.0), "Garden": (2, 5.0, 25.0)}
+    # The deltas agree with a full recount, apart from ranges the reconcile job tightens
+    await reconcile_category_stats()
+    assert await stats(categories) == {"Home": (1, 25.0, 25.0), "Garden": (2, 5.0, 25.0)}
+
+
+async def test_import_applies_deltas_per_batch(categories, monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_BATCH_SIZE", 2)
+    rows = [
+        {"sku": "S1", "name": "Lamp", "description": "d", "base_price": 12.0, "category": "Garden"},
+        {"sku": "S2", "name": "Rake", "description": "d", "base_price": 3.0, "category": "Garden"},
+        {"sku": "S3", "name": "Rug", "description": "d", "base_price": 40.0, "category": "Home"},
+    ]
+    stream = io.StringIO("".join(server.json.dumps(row) + "\n" for row in rows))
+    reports = [report async for report in import_catalog(stream, "ndjson")]
+    assert reports[-1]["status"] == "completed"
+    assert await stats(categories) == {"Home": (1, 10.0, 40.0), "Garden": (2, 3.0, 12.0)}
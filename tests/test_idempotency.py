@@ -0,0 +1,132 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+from server import IDEMPOTENCY_COLLECTION, IdempotencyStore
+
+pytestmark = pytest.mark.anyio
+
+
+def request(key=None):
+    headers = [(b"idempotency-key", key.encode())] if key else []
+    return Request({"type": "http", "method": "POST", "path": "/api/orders", "headers": headers})
+
+
+@pytest.fixture
+def store(mongo):
+    return IdempotencyStore(mongo)
+
+
+class Handler:
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise HTTPException(status_code=400, detail="boom")
+        return {"order": self.calls}
+
+
+async def test_without_a_key_every_request_runs(store):
+    handler = Handler()
+    await store.run(request(), "orders", {"a": 1}, handler)
+    await store.run(request(), "orders", {"a": 1}, handler)
+    assert handler.calls == 2
+
+
+async def test_repeat_replays_the_stored_response(store):
+    handler = Handler()
+    assert await store.run(request("k1"), "orders", {"a": 1}, handler) == {"order": 1}
+    replay = await store.run(request("k1"), "orders", {"a": 1}, handler)
+    assert handler.calls == 1
+    assert json.loads(replay.body) == {"order": 1}
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_keys_are_scoped(store):
+    handler = Handler()
+    await store.run(request("k1"), "orders", {"a": 1}, handler)
+    await store.run(request("k1"), "checkout", {"a": 1}, handler)
+    assert handler.calls == 2
+
+
+async def test_reuse_with_a_different_payload_is_rejected(store):
+    await store.run(request("k1"), "orders", {"a": 1}, Handler())
+    with pytest.raises(HTTPException) as excinfo:
+        await store.run(request("k1"), "orders", {"a": 2}, Handler())
+    assert excinfo.value.status_code == 422
+
+
+async def test_failure_frees_the_key(store, mongo):
+    with pytest.raises(HTTPException):
+        await store.run(request("k1"), "orders", {"a": 1}, Handler(fail=True))
+    assert await mongo[IDEMPOTENCY_COLLECTION].count_documents({}) == 0
+    handler = Handler()
+    assert await store.run(request("k1"), "orders", {"a": 1}, handler) == {"order": 1}
+
+
+async def test_concurrent_duplicate_waits_for_the_first(store):
+    handler = Handler(delay=0.05)
+    first, second = await asyncio.gather(
+        store.run(request("k1"), "orders", {"a": 1}, handler),
+        store.run(request("k1"), "orders", {"a": 1}, handler),
+    )
+    assert handler.calls == 1
+    assert first == {"order": 1}
+    assert json.loads(second.body) == {"order": 1}
+
+
+async def test_duplicate_polls_a_request_on_another_worker(store, mongo, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_POLL_SECONDS", 0.01)
+    fingerprint = IdempotencyStore.fingerprint({"a": 1})
+    now = datetime.now(timezone.utc)
+    await mongo[IDEMPOTENCY_COLLECTION].insert_one({"_id": "orders:k1", "fingerprint": fingerprint, "status": "in_progress",
+                                                   "locked_until": now + timedelta(minutes=1), "created_at": now})
+
+    async def finish_elsewhere():
+        await asyncio.sleep(0.05)
+        await mongo[IDEMPOTENCY_COLLECTION].update_one(
+            {"_id": "orders:k1"}, {"$set": {"status": "completed", "response": {"order": "remote"}}}
+        )
+
+    handler = Handler()
+    replay, _ = await asyncio.gather(store.run(request("k1"), "orders", {"a": 1}, handler), finish_elsewhere())
+    assert handler.calls == 0
+    assert json.loads(replay.body) == {"order": "remote"}
+
+
+async def test_duplicate_gives_up_with_409(store, mongo, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(server, "IDEMPOTENCY_WAIT_SECONDS", 0.05)
+    now = datetime.now(timezone.utc)
+    await mongo[IDEMPOTENCY_COLLECTION].insert_one({"_id": "orders:k1", "fingerprint": IdempotencyStore.fingerprint({"a": 1}),
+                                                   "status": "in_progress", "locked_until": now + timedelta(minutes=1),
+                                                   "created_at": now})
+    with pytest.raises(HTTPException) as excinfo:
+        await store.run(request("k1"), "orders", {"a": 1}, Handler())
+    assert excinfo.value.status_code == 409
+
+
+async def test_abandoned_claim_is_taken_over(store, mongo):
+    now = datetime.now(timezone.utc)
+    await mongo[IDEMPOTENCY_COLLECTION].insert_one({"_id": "orders:k1", "fingerprint": IdempotencyStore.fingerprint({"a": 1}),
+                                                   "status": "in_progress", "locked_until": now - timedelta(seconds=1),
+                                                   "created_at": now})
+    handler = Handler()
+    assert await store.run(request("k1"), "orders", {"a": 1}, handler) == {"order": 1}
+    assert (await mongo[IDEMPOTENCY_COLLECTION].find_one({"_id": "orders:k1"}))["status"] == "completed"
+
+
+async def test_overlong_key(store):
+    with pytest.raises(HTTPException) as excinfo:
+        await store.run(request("k" * 256), "orders", {}, Handler())
+    assert excinfo.value.status_code == 400
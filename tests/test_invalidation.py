@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from server import INVALIDATION_COLLECTION, INVALIDATION_OVERLAP_SECONDS, InvalidationBus
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def bus(mongo):
+    bus = InvalidationBus(mongo)
+    bus.received = []
+    bus.subscribe("products", bus.received.append)
+    return bus
+
+
+def event(event_id, keys, worker="other", seconds_ago=0.0):
+    return {"_id": event_id, "topic": "products", "keys": keys, "worker": worker,
+            "ts": datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)}
+
+
+async def poll(bus, mongo):
+    # One polling pass, as the listener does when tailing is unavailable
+    async for doc in mongo[INVALIDATION_COLLECTION].find(bus._since_query()).sort("ts", 1):
+        bus._handle(doc)
+
+
+async def test_publish_applies_locally_and_records_the_event(bus, mongo):
+    await bus.publish("products", ["p1"])
+    await bus.publish("products", ["p2"], apply_locally=False)
+    assert bus.received == [["p1"]]
+    docs = await mongo[INVALIDATION_COLLECTION].find({}).sort("ts", 1).to_list(None)
+    assert [(d["keys"], d["worker"]) for d in docs] == [(["p1"], server.WORKER_ID), (["p2"], server.WORKER_ID)]
+
+
+async def test_too_many_keys_collapse_to_everything(bus, mongo, monkeypatch):
+    monkeypatch.setattr(server, "INVALIDATION_MAX_KEYS", 2)
+    await bus.publish("products", ["a", "b", "c"])
+    assert bus.received == [[]]
+    assert (await mongo[INVALIDATION_COLLECTION].find_one({}))["keys"] == []
+
+
+def test_each_remote_event_is_dispatched_once(bus):
+    first = event(1, ["p1"])
+    bus._handle(first)
+    bus._handle(dict(first))
+    bus._handle(event(2, ["p2"]))
+    assert bus.received == [["p1"], ["p2"]]
+
+
+def test_own_events_are_skipped(bus):
+    bus._handle(event(1, ["p1"], worker=server.WORKER_ID))
+    assert bus.received == []
+
+
+def test_seen_ids_are_forgotten_outside_the_overlap_window(bus):
+    bus._handle(event(1, ["old"], seconds_ago=INVALIDATION_OVERLAP_SECONDS * 3))
+    bus._handle(event(2, ["new"]))
+    bus._since_query()
+    assert set(bus._seen) == {2}
+
+
+async def test_overlapping_polls_deliver_another_workers_events_once(bus, mongo, monkeypatch):
+    publisher = InvalidationBus(mongo)
+    with monkeypatch.context() as patch:
+        patch.setattr(server, "WORKER_ID", "other-worker")
+        await publisher.publish("products", ["p1"])
+        await publisher.publish("products", ["p2"])
+    await poll(bus, mongo)
+    await poll(bus, mongo)
+    assert bus.received == [["p1"], ["p2"]]
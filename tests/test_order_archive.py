@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from server import ORDER_ARCHIVE_COLLECTION, ORDER_SUMMARY_FIELDS, compact_order, expand_order, get_orders
+
+
+def order(**overrides):
+    base = {
+        "id": "o1",
+        "user_id": "u1",
+        "items": [{"product_id": "p1", "quantity": 2, "variation": None, "price": 9.5},
+                  {"product_id": "p2", "quantity": 1, "variation": {"size": "M"}, "price": 20.0}],
+        "shipping_info": {"full_name": "A B", "address": "1 Road", "city": "Town", "phone": ""},
+        "shipping_method": "standard",
+        "subtotal": 39.0,
+        "discount": 0.0,
+        "coupon_code": None,
+        "total": 52.9,
+        "status": "delivered",
+        "payment_status": "paid",
+        "payment_session_id": None,
+        "created_at": "2025-01-02T03:04:05.123000+00:00",
+        "updated_at": "2025-01-05T00:00:00+00:00",
+    }
+    return {**base, **overrides}
+
+
+def test_compact_drops_defaults_and_converts_dates():
+    doc = compact_order(order())
+    assert doc["_id"] == "o1" and "id" not in doc
+    assert not {"discount", "coupon_code", "payment_session_id", "shipping_method"} & doc.keys()
+    assert isinstance(doc["created_at"], datetime)
+    assert "variation" not in doc["items"][0]
+    assert "phone" not in doc["shipping_info"]
+
+
+def test_round_trip_with_defaults():
+    original = order()
+    doc = compact_order(original)
+    # BSON stores naive UTC datetimes
+    doc["created_at"] = doc["created_at"].replace(tzinfo=None)
+    doc["updated_at"] = doc["updated_at"].replace(tzinfo=None)
+    assert expand_order(doc) == original
+
+
+def test_round_trip_keeps_non_default_values():
+    original = order(discount=3.9, coupon_code="TENOFF", shipping_method="express", payment_session_id="cs_1",
+                     shipping_info={"full_name": "A B", "address": "1 Road", "city": "Town", "phone": "555"})
+    doc = compact_order(original)
+    assert doc["coupon_code"] == "TENOFF" and doc["shipping_info"]["phone"] == "555"
+    assert expand_order(doc) == original
+
+
+def test_projected_expand_only_restores_projected_defaults():
+    doc = compact_order(order())
+    projected = {field: doc[field] for field in ("_id", "status", "total") if field in doc}
+    assert expand_order(projected, ["id", "status", "total"]) == {"id": "o1", "status": "delivered", "total": 52.9}
+    assert expand_order({"_id": "o1"}, ["id", "discount"]) == {"id": "o1", "discount": 0.0}
+
+
+@pytest.mark.anyio
+async def test_history_page_rows_have_the_same_keys(mongo):
+    hot = order(id="hot", created_at="2025-06-01T00:00:00+00:00", order_number="N2", item_count=3)
+    cold = order(id="cold", order_number="N1", item_count=3)
+    await mongo.orders.insert_one(dict(hot))
+    await mongo[ORDER_ARCHIVE_COLLECTION].insert_one(compact_order(cold))
+    await mongo.archive_state.insert_one({"_id": "orders", "horizon": "2025-03-01T00:00:00+00:00"})
+    page = await get_orders(cursor=None, limit=10, current_user={"id": "u1"})
+    assert [o["id"] for o in page["orders"]] == ["hot", "cold"]
+    assert page["orders"][0].keys() == page["orders"][1].keys() == set(ORDER_SUMMARY_FIELDS)
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from server import ORDER_ARCHIVE_COLLECTION, archive_orders, archive_totals, compact_order
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def quiet_bus(monkeypatch):
+    async def publish(topic, keys=None, apply_locally=True):
+        pass
+
+    monkeypatch.setattr(server.invalidation_bus, "publish", publish)
+
+
+def order(order_id, days_old, status="delivered", payment_status="paid", total=10.0):
+    created = (datetime.now(timezone.utc) - timedelta(days=days_old)).isoformat()
+    return {"id": order_id, "user_id": "u1", "items": [], "status": status, "payment_status": payment_status,
+            "total": total, "created_at": created, "updated_at": created}
+
+
+async def test_archive_keeps_running_totals(mongo):
+    await mongo.orders.insert_many([
+        order("old-paid", 400, total=30.0),
+        order("old-unpaid", 400, status="cancelled", payment_status="pending", total=99.0),
+        order("old-open", 400, status="shipped"),
+        order("new", 1),
+    ])
+    assert await archive_totals() == {"count": 0, "revenue": 0.0}
+    assert (await archive_orders())["archived"] == 2
+    assert await archive_totals() == {"count": 2, "revenue": 30.0}
+    assert sorted(await mongo.orders.distinct("id")) == ["new", "old-open"]
+
+    await mongo.orders.insert_one(order("old-paid-2", 300, total=12.5))
+    await archive_orders()
+    assert await archive_totals() == {"count": 3, "revenue": 42.5}
+
+
+async def test_first_run_counts_an_existing_archive_once(mongo):
+    await mongo[ORDER_ARCHIVE_COLLECTION].insert_many([
+        compact_order(order("a1", 500, total=5.0)),
+        compact_order(order("a2", 500, payment_status="failed", total=7.0)),
+    ])
+    await archive_orders()
+    await archive_orders()
+    assert await archive_totals() == {"count": 2, "revenue": 5.0}
+
+
+async def test_analytics_reads_totals_not_the_archive(mongo, monkeypatch):
+    await mongo.orders.insert_many([order("old", 400, total=20.0), order("new", 1, total=3.0)])
+    await archive_orders()
+    # Tamper with the archive: analytics must not scan it
+    await mongo[ORDER_ARCHIVE_COLLECTION].delete_many({})
+    analytics = await server.get_analytics()
+    assert analytics["total_orders"] == 2
+    assert analytics["archived_orders"] == 1
+    assert analytics["total_revenue"] == 23.0
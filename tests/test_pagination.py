@@ -0,0 +1,45 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, decode_order_cursor, encode_cursor, get_orders
+
+
+def test_round_trip():
+    values = ["2025-01-02T03:04:05+00:00", "order-1"]
+    assert decode_cursor(encode_cursor(values), 2) == values
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"{not json").decode(),
+    base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+    encode_cursor(["only-one"]),
+])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, 2)
+    assert excinfo.value.status_code == 400
+
+
+@pytest.mark.parametrize("values", [["bad", "x"], [1700000000, "x"], ["2025-01-02T03:04:05+00:00", 7], [None, None]])
+def test_invalid_order_cursor_is_a_400(values):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_order_cursor(encode_cursor(values))
+    assert excinfo.value.status_code == 400
+
+
+def test_order_cursor_parses_timestamp():
+    created_at, created_at_date, order_id = decode_order_cursor(encode_cursor(["2025-01-02T03:04:05+00:00", "o1"]))
+    assert created_at == "2025-01-02T03:04:05+00:00"
+    assert created_at_date == datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert order_id == "o1"
+
+
+@pytest.mark.anyio
+async def test_orders_route_rejects_bad_cursor(mongo):
+    with pytest.raises(HTTPException) as excinfo:
+        await get_orders(cursor=encode_cursor(["bad", "x"]), limit=20, current_user={"id": "u1"})
+    assert excinfo.value.status_code == 400
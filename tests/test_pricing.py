@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import CartItem, Coupon, PricingEngine, create_coupon
+
+
+def cart(*lines):
+    return [CartItem(product_id=f"p{i}", price=price, quantity=quantity) for i, (price, quantity) in enumerate(lines)]
+
+
+@pytest.fixture
+def engine():
+    engine = PricingEngine()
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    past = datetime.now(timezone.utc) - timedelta(days=1)
+    engine.coupons = {
+        "TENOFF": {"code": "TENOFF", "discount_type": "percentage", "discount_value": 10.0, "expiry_date": future.isoformat()},
+        "FIVE": {"code": "FIVE", "discount_type": "fixed", "discount_value": 5.0},
+        "BIG": {"code": "BIG", "discount_type": "fixed", "discount_value": 500.0},
+        "MIN50": {"code": "MIN50", "discount_type": "fixed", "discount_value": 5.0, "min_order_value": 50.0},
+        "OLD": {"code": "OLD", "discount_type": "percentage", "discount_value": 50.0, "expiry_date": past},
+        "NAIVE": {"code": "NAIVE", "discount_type": "fixed", "discount_value": 5.0,
+                  "expiry_date": past.replace(tzinfo=None)},
+    }
+    return engine
+
+
+def test_without_coupon(engine):
+    quote = engine.quote(cart((20.0, 2), (5.5, 1)), "express")
+    assert quote == {
+        "item_count": 3,
+        "subtotal": 45.5,
+        "discount": 0.0,
+        "coupon_code": None,
+        "coupon_error": None,
+        "tax": 4.55,
+        "shipping_method": "express",
+        "shipping_cost": 25.0,
+        "total": 75.05,
+    }
+
+
+def test_unknown_shipping_method_uses_default_cost(engine):
+    assert engine.quote(cart((10.0, 1)), "drone")["shipping_cost"] == engine.rules.default_shipping_cost
+
+
+def test_percentage_coupon_is_case_insensitive(engine):
+    quote = engine.quote(cart((40.0, 1), (10.0, 1)), "pickup", "tenoff")
+    assert quote["coupon_code"] == "TENOFF"
+    assert quote["discount"] == 5.0
+    assert quote["tax"] == 4.5
+    assert quote["total"] == 49.5
+
+
+def test_fixed_coupon(engine):
+    quote = engine.quote(cart((30.0, 1)), "pickup", "FIVE")
+    assert quote["discount"] == 5.0
+    assert quote["total"] == 27.5
+
+
+def test_fixed_coupon_is_capped_at_subtotal(engine):
+    quote = engine.quote(cart((30.0, 1)), "standard", "BIG")
+    assert quote["discount"] == 30.0
+    assert quote["tax"] == 0.0
+    assert quote["total"] == 10.0
+
+
+@pytest.mark.parametrize("code", ["OLD", "NAIVE"])
+def test_expired_coupon(engine, code):
+    quote = engine.quote(cart((100.0, 1)), "pickup", code)
+    assert quote["coupon_error"] == "Coupon has expired"
+    assert quote["coupon_code"] is None
+    assert quote["discount"] == 0.0
+
+
+def test_minimum_order_value(engine):
+    below = engine.quote(cart((49.99, 1)), "pickup", "MIN50")
+    assert below["coupon_error"] == "Coupon requires a minimum order of 50.00"
+    assert below["discount"] == 0.0
+    assert engine.quote(cart((25.0, 2)), "pickup", "MIN50")["discount"] == 5.0
+
+
+def test_unknown_coupon(engine):
+    quote = engine.quote(cart((10.0, 1)), "pickup", "NOPE")
+    assert quote["coupon_error"] == "Invalid coupon code"
+    assert quote["total"] == 11.0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("discount_type, discount_value", [("fixed", 0), ("fixed", -5), ("percentage", -10), ("percentage", 150)])
+async def test_create_coupon_rejects_bad_discounts(mongo, discount_type, discount_value):
+    coupon = Coupon(code="bad", discount_type=discount_type, discount_value=discount_value)
+    with pytest.raises(HTTPException) as excinfo:
+        await create_coupon(coupon)
+    assert excinfo.value.status_code == 400
+    assert await mongo.coupons.count_documents({}) == 0
+
+
+@pytest.mark.anyio
+async def test_create_coupon_accepts_full_percentage(mongo, monkeypatch):
+    async def publish(topic, keys=None, apply_locally=True):
+        pass
+
+    monkeypatch.setattr(server.invalidation_bus, "publish", publish)
+    await create_coupon(Coupon(code="free", discount_type="percentage", discount_value=100))
+    assert (await mongo.coupons.find_one({"code": "FREE"}))["discount_value"] == 100
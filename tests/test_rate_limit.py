@@ -0,0 +1,48 @@
+import pytest
+
+import server
+from server import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_allows_capacity_then_reports_wait(clock):
+    limiter = RateLimiter({"search": (3, 60)})
+    assert [limiter.acquire("search", ["ip:a"]) for _ in range(3)] == [None, None, None]
+    assert limiter.acquire("search", ["ip:a"]) == pytest.approx(20.0)
+    assert limiter.counters["search"] == {"allowed": 3, "limited": 1}
+
+
+def test_refills_over_time(clock):
+    limiter = RateLimiter({"search": (2, 10)})
+    limiter.acquire("search", ["ip:a"])
+    limiter.acquire("search", ["ip:a"])
+    clock[0] += 2.5
+    assert limiter.acquire("search", ["ip:a"]) == pytest.approx(2.5)
+    clock[0] += 2.5
+    assert limiter.acquire("search", ["ip:a"]) is None
+
+
+def test_keys_are_independent(clock):
+    limiter = RateLimiter({"search": (1, 60)})
+    assert limiter.acquire("search", ["ip:a"]) is None
+    assert limiter.acquire("search", ["ip:b"]) is None
+    assert limiter.acquire("search", ["ip:a"]) is not None
+
+
+def test_every_key_must_have_a_token(clock):
+    limiter = RateLimiter({"search": (1, 60)})
+    assert limiter.acquire("search", ["user:u1"]) is None
+    # A fresh IP does not help an exhausted user, and is not charged for the refusal
+    assert limiter.acquire("search", ["ip:b", "user:u1"]) is not None
+    assert limiter.acquire("search", ["ip:b"]) is None
+
+
+def test_unknown_route_is_unlimited(clock):
+    limiter = RateLimiter({"search": (1, 60)})
+    assert all(limiter.acquire("checkout", ["ip:a"]) is None for _ in range(5))
@@ -0,0 +1,42 @@
+import httpx
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def warming_up(monkeypatch):
+    monkeypatch.setattr(server.startup_profile, "ready", False)
+    monkeypatch.setattr(server.db_health, "degraded", True)
+    server.catalog_cache.clear()
+
+
+async def get(path):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path)
+
+
+async def test_catalog_reads_pass_the_gate_with_a_snapshot(mongo, snapshot, warming_up):
+    await mongo.products.insert_one({"id": "p1", "name": "Lamp", "description": "d", "base_price": 5.0,
+                                     "category": "Home", "featured": True, "created_at": "2025-01-01T00:00:00+00:00"})
+    await mongo.categories.insert_one({"id": "c1", "name": "Home", "slug": "home"})
+    await server.write_catalog_snapshot(snapshot.path)
+    # Everything the snapshot serves must come from the file, not the database
+    await mongo.products.delete_many({})
+    await mongo.categories.delete_many({})
+
+    assert [p["id"] for p in (await get("/api/products")).json()] == ["p1"]
+    assert (await get("/api/products/p1")).json()["name"] == "Lamp"
+    assert [p["id"] for p in (await get("/api/products/featured")).json()] == ["p1"]
+    assert [c["id"] for c in (await get("/api/categories")).json()] == ["c1"]
+    assert (await get("/api/products/suggest?q=la")).status_code == 503
+    assert (await get("/api/health/live")).status_code == 200
+
+
+async def test_everything_else_waits_for_warm_up(mongo, snapshot, warming_up):
+    assert not snapshot.available
+    assert (await get("/api/products")).status_code == 503
+    assert (await get("/api/categories")).status_code == 503
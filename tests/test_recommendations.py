@@ -0,0 +1,32 @@
+from collections import Counter
+from itertools import permutations
+
+from server import cooccurrence_pairs
+
+
+def as_counter(left, right, counts):
+    return Counter({(int(l), int(r)): int(c) for l, r, c in zip(left, right, counts)})
+
+
+def test_counts_ordered_pairs_within_each_order():
+    orders = [[0, 1, 2], [1, 2], [3]]
+    assert as_counter(*cooccurrence_pairs(orders, 4)) == Counter({
+        (0, 1): 1, (1, 0): 1, (0, 2): 1, (2, 0): 1, (1, 2): 2, (2, 1): 2,
+    })
+
+
+def test_matches_brute_force():
+    orders = [[4, 0, 7], [7, 4], [1], [], [0, 1, 2, 3, 4, 5, 6, 7], [2, 7]]
+    expected = Counter(pair for order in orders for pair in permutations(order, 2))
+    assert as_counter(*cooccurrence_pairs(orders, 8)) == expected
+
+
+def test_left_is_sorted_for_grouping():
+    left, _, _ = cooccurrence_pairs([[5, 3, 1], [2, 5]], 6)
+    assert list(left) == sorted(left)
+
+
+def test_empty_chunk():
+    for orders in ([], [[], []], [[3]]):
+        left, right, counts = cooccurrence_pairs(orders, 4)
+        assert len(left) == len(right) == len(counts) == 0
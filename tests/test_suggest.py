@@ -0,0 +1,71 @@
+import pytest
+
+from server import SuggestIndex
+
+
+def product(product_id, name, brand=None, units_sold=0, rating=0.0):
+    return {"id": product_id, "name": name, "brand": brand, "units_sold": units_sold, "rating": rating}
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex(max_entries=100)
+    index._set_product("1", product("1", "Red Running Shoe", "Acme", units_sold=5))
+    index._set_product("2", product("2", "Running Shorts", "Acme", units_sold=50))
+    index._set_product("3", product("3", "Rain Jacket", "Zephyr", units_sold=5, rating=4.5))
+    index._set_category("c1", {"id": "c1", "name": "Running", "product_count": 2})
+    return index
+
+
+def labels(results):
+    return [r["label"] for r in results]
+
+
+def test_prefix_matches_any_word_ranked_by_popularity(index):
+    assert labels(index.suggest("run", 10)) == ["Running Shorts", "Red Running Shoe", "Running"]
+    assert labels(index.suggest("  RA ", 10)) == ["Rain Jacket"]
+
+
+def test_limit_and_blank_prefix(index):
+    assert len(index.suggest("r", 2)) == 2
+    assert index.suggest("  ", 10) == []
+
+
+def test_brands_are_counted_per_product(index):
+    assert index.suggest("acme", 10) == [{"type": "brand", "id": "Acme", "label": "Acme"}]
+    assert index._brands == {"Acme": 2, "Zephyr": 1}
+
+
+def test_update_replaces_old_terms(index):
+    index._set_product("2", product("2", "Trail Shorts", "Acme", units_sold=50))
+    assert "Trail Shorts" in labels(index.suggest("tra", 10))
+    assert "Running Shorts" not in labels(index.suggest("run", 10))
+    assert index._brands["Acme"] == 2
+
+
+def test_remove_drops_entry_and_unused_brand(index):
+    index._set_product("3", None)
+    index._set_category("c1", None)
+    assert index.suggest("rai", 10) == []
+    assert index.suggest("zep", 10) == []
+    assert labels(index.suggest("run", 10)) == ["Running Shorts", "Red Running Shoe"]
+    assert all(ref in index._entries for _, ref in index._terms)
+
+
+def test_max_entries_drops_overflow():
+    index = SuggestIndex(max_entries=2)
+    for i in range(4):
+        index._set_category(str(i), {"id": str(i), "name": f"cat {i}"})
+    assert len(index._entries) == 2
+    assert index.dropped == 2
+
+
+def test_build_matches_incremental(index):
+    products = [product("1", "Red Running Shoe", "Acme", units_sold=5),
+                product("2", "Running Shorts", "Acme", units_sold=50),
+                product("3", "Rain Jacket", "Zephyr", units_sold=5, rating=4.5)]
+    terms, entries, brands, dropped = index._build(products, [{"id": "c1", "name": "Running", "product_count": 2}])
+    assert terms == index._terms
+    assert brands == index._brands
+    assert dropped == 0
+    assert {ref: entry["label"] for ref, entry in entries.items()} == {ref: e["label"] for ref, e in index._entries.items()}
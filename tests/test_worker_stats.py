@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from server import WORKER_ID, WORKER_STATS_COLLECTION, get_query_stats, get_task_stats, worker_stats
+
+pytestmark = pytest.mark.anyio
+
+
+def shape(key, count, total_ms, max_ms, slow_count=0):
+    return {"shape": key, "collection": "orders", "operation": "find", "count": count, "total_ms": total_ms,
+            "max_ms": max_ms, "slow_count": slow_count, "last_route": "GET /api/orders", "last_explained": 0.0}
+
+
+@pytest.fixture
+def local_shapes(monkeypatch):
+    shapes = {"a": shape("a", 2, 10.0, 6.0), "b": shape("b", 1, 1.0, 1.0)}
+    monkeypatch.setattr(server.query_profiler, "shapes", shapes)
+    return shapes
+
+
+async def test_query_stats_merge_live_workers(mongo, local_shapes):
+    now = datetime.now(timezone.utc)
+    await mongo[WORKER_STATS_COLLECTION].insert_many([
+        {"_id": "other", "updated_at": now, "queries": {
+            "tracked_shapes": 2, "dropped_shapes": 1,
+            "shapes": [{**shape("a", 3, 30.0, 20.0, slow_count=1), "avg_ms": 10.0}, {**shape("c", 1, 5.0, 5.0), "avg_ms": 5.0}]}},
+        {"_id": "gone", "updated_at": now - timedelta(hours=1), "queries": {
+            "tracked_shapes": 1, "dropped_shapes": 0, "shapes": [shape("b", 100, 1000.0, 50.0)]}},
+    ])
+    stats = await get_query_stats(limit=20, include_plans=False)
+    assert stats["workers"] == 2
+    assert stats["tracked_shapes"] == 4 and stats["dropped_shapes"] == 1
+    assert [(s["shape"], s["count"], s["total_ms"], s["max_ms"], s["slow_count"], s["avg_ms"]) for s in stats["shapes"]] == [
+        ("a", 5, 40.0, 20.0, 1, 8.0),
+        ("c", 1, 5.0, 5.0, 0, 5.0),
+        ("b", 1, 1.0, 1.0, 0, 1.0),
+    ]
+
+
+async def test_publish_replaces_this_workers_document(mongo, local_shapes):
+    await worker_stats.publish()
+    await worker_stats.publish()
+    docs = await mongo[WORKER_STATS_COLLECTION].find({}).to_list(None)
+    assert [doc["_id"] for doc in docs] == [WORKER_ID]
+    assert {s["shape"] for s in docs[0]["queries"]["shapes"]} == {"a", "b"}
+    assert "tasks" in docs[0] and "limits" in docs[0]
+
+
+async def test_other_reports_list_each_worker(mongo):
+    await mongo[WORKER_STATS_COLLECTION].insert_one(
+        {"_id": "other", "host": "h2", "pid": 7, "updated_at": datetime.now(timezone.utc), "tasks": {"queue_size": 3}}
+    )
+    workers = (await get_task_stats())["workers"]
+    assert [w["worker"] for w in workers] == [WORKER_ID, "other"]
+    assert workers[0]["stats"] == server.background_tasks.stats()
+    assert workers[1]["stats"] == {"queue_size": 3}